@@ -0,0 +1,119 @@
+import os
+import re
+from typing import Literal, TypedDict
+
+
+### Answer format rules
+# - Expected shape of the answer is inferred from the question (number, comma separated list, algebraic notation, name)
+# - Obvious answers are accepted or normalized locally, clearly wrong shapes are rejected with feedback
+# - Only ambiguous answers go to the LLM validator
+
+ANSWER_FORMAT_RULES = os.environ.get("ANSWER_FORMAT_RULES", "true").lower() in ("1", "true", "yes")
+
+# Longer answers without expected shape are left for LLM validator
+MAX_SHORT_ANSWER_WORDS = 5
+
+Shape = Literal["number", "list", "algebraic", "name", "unknown"]
+
+
+class FormatCheck(TypedDict):
+    verdict: Literal["accept", "reject", "ambiguous"]
+    answer: str # Normalized answer
+    feedback: str
+
+
+NUMBER = r"-?\d+(?:[.,]\d+)*"
+ALGEBRAIC_MOVE = r"(?:O-O(?:-O)?|[KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=[QRBN])?)[+#]?"
+LEADING_PHRASES = r"^(?:final answer|the answer is|answer)\s*[:\-]?\s*"
+
+
+def infer_shape(question: str) -> Shape:
+    """Expected shape of the answer from wording of the question"""
+
+    text = question.lower()
+
+    if "algebraic notation" in text:
+        return "algebraic"
+    if re.search(r"comma[\s-]*(?:separated|delimited)|separated by commas", text):
+        return "list"
+    if re.search(r"\bhow (?:many|much)\b|\bwhat (?:is|was) the (?:total )?(?:number|count|amount)\b|\bnumerical? (?:answer|value)\b|\bdecimal places\b", text):
+        return "number"
+    if re.search(r"\b(?:surname|first name|last name|given name|full name)\b|\bwho\b", text):
+        return "name"
+
+    return "unknown"
+
+
+def _clean(answer: str) -> str:
+    """Strips whitespace, leading phrases, wrapping quotes and trailing period"""
+
+    answer = answer.strip()
+    answer = re.sub(LEADING_PHRASES, "", answer, flags=re.IGNORECASE).strip()
+    if len(answer) > 1 and answer[0] == answer[-1] and answer[0] in "\"'`":
+        answer = answer[1:-1].strip()
+    return answer.rstrip(".").strip() if not re.search(r"\d\.$", answer) else answer[:-1]
+
+
+def _is_sentence(answer: str) -> bool:
+    return len(answer.split()) > MAX_SHORT_ANSWER_WORDS or bool(re.search(r"[.!?;:]\s", answer))
+
+
+def check_answer(question: str, answer: str) -> FormatCheck:
+    """Checks answer against shape expected by the question"""
+
+    shape = infer_shape(question)
+    cleaned = _clean(answer)
+
+    def accept(normalized: str = cleaned) -> FormatCheck:
+        return {"verdict": "accept", "answer": normalized, "feedback": ""}
+
+    def reject(feedback: str) -> FormatCheck:
+        return {"verdict": "reject", "answer": "", "feedback": feedback}
+
+    ambiguous: FormatCheck = {"verdict": "ambiguous", "answer": cleaned, "feedback": ""}
+
+    if not cleaned:
+        return reject("The answer is empty.")
+
+    if shape == "number":
+        numbers = re.findall(NUMBER, cleaned)
+        if re.fullmatch(NUMBER, cleaned):
+            # Thousands separators are dropped unless they are decimals
+            return accept(re.sub(r",(?=\d{3}\b)", "", cleaned))
+        if len(numbers) == 1 and not _is_sentence(cleaned):
+            return accept(re.sub(r",(?=\d{3}\b)", "", numbers[0]))
+        if not numbers:
+            return reject("The question asks for a number, the answer has to be a single number.")
+        return ambiguous
+
+    if shape == "algebraic":
+        if re.fullmatch(ALGEBRAIC_MOVE, cleaned):
+            return accept()
+        moves = re.findall(rf"(?<![\w-]){ALGEBRAIC_MOVE}(?![\w-])", cleaned)
+        # Move is taken out of a sentence only if the piece is not named in words ("Rook to d5")
+        if len(set(moves)) == 1 and not re.search(r"\b(?:king|queen|rook|bishop|knight|pawn|castles?)\b", cleaned, re.IGNORECASE):
+            return accept(moves[0])
+        if moves:
+            return ambiguous
+        return reject("The answer has to be a single move in algebraic notation, e.g. Qxe4, without any other words.")
+
+    if shape == "list":
+        if _is_sentence(cleaned) and ", " not in cleaned:
+            return ambiguous
+        items = [item.strip() for item in re.split(r"\s*[,;]\s*|\n", cleaned) if item.strip()]
+        if any(_is_sentence(item) for item in items):
+            return ambiguous
+        if re.search(r"alphabeti[cz]", question.lower()):
+            items = sorted(items, key=str.lower)
+        return accept(", ".join(items))
+
+    if shape == "name":
+        if not _is_sentence(cleaned) and not re.search(r"[!?;:]", cleaned):
+            return accept()
+        return ambiguous
+
+    # Unknown shape - short plain answers are accepted, anything else is left for LLM validator
+    if not _is_sentence(cleaned) and not re.search(r"[!?;:\n]", cleaned):
+        return accept()
+
+    return ambiguous
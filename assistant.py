@@ -2,28 +2,26 @@ import os
 from dotenv import load_dotenv
 from typing import Literal
 
-from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 from state import TaskState
 from utils import *
+from knowledge import add_knowledge, select_knowledge
+from models import get_tool_model, invoke_tiered
+from prompts import build_prompt
 
 
 load_dotenv()
 
-assistant_model = AzureChatOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    # azure_deployment="gpt-4.1-mini",
-    azure_deployment="gpt-4.1",
-    openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-)
-
 
 ### Assistant with tools
 # - Can use tools
 # - Executes next step in the plan
+# - Starts with fast model, escalates to large model (see models.py)
+# - Prompt starts with task prefix shared by all steps (see prompts.py)
 
-def assistant(state: TaskState):
+def assistant(state: TaskState, config: RunnableConfig):
 
     question = state["question"]
     tool_messages = state['tool_messages']
@@ -31,7 +29,7 @@ def assistant(state: TaskState):
     plan = state["plan"]
     knowledge = state["collected_knowledge"]
     past_steps = state["past_steps"]
-    tools = state["tools_list"]
+    tools = config["configurable"]["tools"] # Not in state, tools can't be checkpointed
 
 
     ### Process data returned from tool
@@ -40,60 +38,65 @@ def assistant(state: TaskState):
         # Add tool answer to assistant history (local for 1 task processing)
         assistant_messages.extend(tool_messages)
         # Collect gained knowledge (global for full processing)
-        knowledge += "\n\n".join([str(tool_message.content) for tool_message in tool_messages]) + "\n\n"
+        for tool_message in tool_messages:
+            knowledge = add_knowledge(knowledge, content_text(tool_message.content))
 
 
-    ### Starting new partial task, build the system prompt
+    ### Starting new partial task, build the prompt
 
     if len(assistant_messages) == 0:
 
-        assistant_system_prompt = (
-            f"You are an AI assistant anwering questions. "
-            "Your goal is get closer to answering following question:\n"
-            f"{question}\n\n"
+        assistant_instructions = (
+            "You are an AI assistant executing one step of the plan. "
+            "Your goal is get closer to answering the question above. "
             "When doing web search, be very specific and precise with your queries and specify all the details - language, year, etc. "
-            "When generating Python code, do not continue, until you generate syntatically correct code."
+            "When generating Python code, do not continue, until you generate syntatically correct code. "
+            "When you need several independent lookups, request all the tool calls at once."
         )
 
-        if knowledge:
-            assistant_system_prompt += f"\n\nYou can use following knowledge for your answer:\n{knowledge}"
-
-        if past_steps:
-            assistant_system_prompt += f"\n\nYou can use following history:\n{str(past_steps)}"
-
-        # Add file to prompt
-        system_content = add_file_to_prompt(assistant_system_prompt, state)
-
-        # Note: System prompt, but human message, because it can contain images, which are not correctly interpreted in system prompt
-        system_message = HumanMessage(
-            content=system_content
-        )
+        # Only knowledge relevant to the current step
+        relevant_knowledge = select_knowledge(knowledge, f"{plan[0]}\n{question}")
+        history = "\n".join(f"- {step}: {result}" for step, result in past_steps)
 
         plan_str = "\n".join(f"{i+1}. {step}" for i, step in enumerate(plan))
         task = plan[0]
-        task_formatted = (
-            "\n\nFor the following plan:\n"
-            f"{plan_str}\n\nYou are tasked with executing step {1}, {task}."
-        )
 
-        human_message = HumanMessage(content=task_formatted)
-
-        assistant_messages.append(system_message)
-        assistant_messages.append(human_message)
+        # Changing content after the stable instructions
+        assistant_messages.extend(build_prompt(state, assistant_instructions, [
+            ("You can use following knowledge for your answer:", relevant_knowledge),
+            ("You can use following history:", history),
+            ("For the following plan:", f"{plan_str}\n\nYou are tasked with executing step {1}, {task}."),
+        ]))
 
 
     ### Continue processing partial task
 
-    response = assistant_model.bind_tools(tools, parallel_tool_calls=False).invoke(assistant_messages)
+    response, escalate = invoke_tiered(
+        "assistant",
+        lambda tier: get_tool_model("assistant", tools, tier=tier, parallel_tool_calls=True),
+        assistant_messages,
+        escalated=state.get("escalated", False),
+        confident=is_confident_response,
+    )
     assistant_messages.append(response)
 
     return {
         "tool_messages": [response],
         "assistant_messages": assistant_messages,
-        "collected_knowledge": knowledge
+        "collected_knowledge": knowledge,
+        "escalated": state.get("escalated", False) or escalate
     }
 
 
+def is_confident_response(response) -> bool:
+    """Response has valid tool calls or non empty content"""
+
+    if getattr(response, "invalid_tool_calls", None):
+        return False
+
+    return bool(response.tool_calls or content_text(response.content).strip())
+
+
 def tools_or_replanner_condition(state: TaskState) -> Literal["tools", "replanner"]:
     """
     If last message in the state is a tool call, navigate to the tools node, otherwise to the validator node.
@@ -0,0 +1,448 @@
+import os
+import re
+import ast
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import subprocess
+import tracemalloc
+from collections import defaultdict
+from typing import Any
+
+import pandas as pd
+from PIL import Image
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+import models
+from answer_format import check_answer
+from main_mcp import build_graph, build_task_input
+from mcp_pool import open_mcp_tools
+
+# Only local measurement
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+
+### Offline benchmark
+# - Same graph and MCP connection (mcp_pool.py) as main_mcp.py with scripted chat model and stub MCP server (benchmark_mcp_server.py)
+# - Replays question shapes from questions.txt (text, image, table, audio, YouTube, code file)
+# - Reports per-node, per-tool and per-task latency percentiles, allocations and prompt sizes as JSON
+# - Failed tasks are reported as errors, not as latency samples, and the run exits with non-zero status
+# - Shared prompt prefix - characters at the start of the prompt identical with previous prompt of the task (reusable by provider prompt cache)
+
+BENCHMARK_DIR = os.path.join("tmp", "benchmark")
+
+
+### Scripted chat model
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model stand-in answering every node with scripted response after fixed latency"""
+
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+
+        time.sleep(self.latency)
+
+        tool_names = [tool["function"]["name"] for tool in kwargs.get("tools", [])]
+        message = self._respond(messages, tool_names)
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _answer(question: str) -> str:
+        """Answer of the shape expected by the question, accepted by validator format rules"""
+
+        for answer in ["3", "Rd5", "a, b", "Smith", "right"]:
+            if check_answer(question, answer)["verdict"] == "accept":
+                return answer
+        return "right"
+
+    @staticmethod
+    def _structured(name: str, args: dict) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}"}])
+
+    def _respond(self, messages: list[BaseMessage], tool_names: list[str]) -> AIMessage:
+
+        text = "\n".join(_message_text(message) for message in messages)
+
+        # Planner
+        if "Plan" in tool_names:
+            return self._structured("Plan", {"steps": ["Collect information needed for the question", "Provide the final answer"]})
+
+        # Replanner - continue with remaining steps of the original plan, then answer
+        if "Act" in tool_names:
+            plan_match = re.search(r"Your original plan was this:\n(.*)\n", text)
+            try:
+                plan = ast.literal_eval(plan_match.group(1)) if plan_match else []
+            except (ValueError, SyntaxError):
+                plan = []
+            if len(plan) > 1:
+                return self._structured("Act", {"action": {"steps": plan[1:]}})
+            question_match = re.search(r"The question:\n(.*?)\n\n", text, re.DOTALL)
+            return self._structured("Act", {"action": {"response": self._answer(question_match.group(1) if question_match else "")}})
+
+        # Validator
+        if "AnswerFeedback" in tool_names:
+            return self._structured("AnswerFeedback", {"answer_accepted": True, "answer_feedback": ""})
+
+        # Assistant - summarize tool results, or call tool fitting the question
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content=f"Step finished using {len(messages[-1].content)} characters of tool output.")
+
+        tool_calls = []
+        if "youtube.com" in text:
+            tool_calls = [("transcribe_video", {"video_url": "https://www.youtube.com/watch?v=1htKBjuUWec"})]
+        elif ".mp3" in text:
+            tool_calls = [("transcribe_audio", {"audio_file": os.path.join(BENCHMARK_DIR, "audio.mp3")})]
+        elif "query_table" in text:
+            tool_calls = [("query_table", {"file_name": "benchmark/table.xlsx", "aggregation": "sum"})]
+        elif "data:image" in text:
+            tool_calls = []
+        else:
+            # Two independent lookups to exercise parallel tool calls
+            tool_calls = [("websearch", {"websearch_query": "first lookup"}), ("wiki_search", {"wiki_search_query": "second lookup"})]
+
+        tool_calls = [
+            {"name": name, "args": args, "id": f"call_{i}"}
+            for i, (name, args) in enumerate(tool_calls)
+            if name in tool_names
+        ]
+        if not tool_calls:
+            return AIMessage(content="Step finished without tools.")
+
+        return AIMessage(content="", tool_calls=tool_calls)
+
+
+def _message_text(message: BaseMessage) -> str:
+
+    if isinstance(message.content, str):
+        return message.content
+
+    parts = []
+    for part in message.content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif part.get("type") == "text":
+            parts.append(part["text"])
+        elif part.get("type") == "image_url":
+            parts.append(part["image_url"]["url"])
+    return "\n".join(parts)
+
+
+### Measurement
+
+class BenchmarkRecorder(BaseCallbackHandler):
+    """Collects node, model and tool timings and prompt sizes from callbacks"""
+
+    run_inline = True
+
+    def __init__(self):
+        self.node_durations: dict[str, list[float]] = defaultdict(list)
+        self.tool_durations: dict[str, list[float]] = defaultdict(list)
+        self.prompt_chars: dict[str, list[int]] = defaultdict(list)
+        self.task_steps: dict[str, int] = defaultdict(int)
+        self.task_prompt_chars: dict[str, int] = defaultdict(int)
+        self.shared_prefix_chars: dict[str, list[int]] = defaultdict(list)
+        self._last_prompts: dict[str, str] = {}
+        self._starts: dict[Any, tuple[str, float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        # Only runs of the nodes themselves, not of runnables inside them
+        if node and kwargs.get("name") == node:
+            self._starts[run_id] = (node, time.perf_counter())
+            self.task_steps[metadata.get("task_id", "")] += 1
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self._starts:
+            node, start = self._starts.pop(run_id)
+            self.node_durations[node].append(time.perf_counter() - start)
+
+    on_chain_error = on_chain_end
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node", "unknown")
+        task_id = metadata.get("task_id", "")
+        prompt = "\n".join(_message_text(message) for message in messages[0])
+        self.prompt_chars[node].append(len(prompt))
+        self.task_prompt_chars[task_id] += len(prompt)
+
+        if task_id in self._last_prompts:
+            self.shared_prefix_chars[node].append(len(os.path.commonprefix([self._last_prompts[task_id], prompt])))
+        self._last_prompts[task_id] = prompt
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._starts[run_id] = (serialized.get("name", "unknown"), time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        if run_id in self._starts:
+            tool_name, start = self._starts.pop(run_id)
+            self.tool_durations[tool_name].append(time.perf_counter() - start)
+
+    on_tool_error = on_tool_end
+
+
+def percentiles(values: list[float], scale: float = 1000) -> dict:
+    """Latency summary in milliseconds (nearest-rank percentiles)"""
+
+    if not values:
+        return {"count": 0}
+
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * scale
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) * scale,
+        "p50": rank(50),
+        "p90": rank(90),
+        "p99": rank(99),
+        "max": ordered[-1] * scale,
+    }
+
+
+### Questions
+
+def load_questions(path: str = "questions.txt") -> list[dict]:
+    """Parses unique questions from the run log"""
+
+    with open(path) as f:
+        content = f.read()
+
+    questions = {}
+    pattern = r"Task ID: (\S+)\nQuestion: (.*?)\nFile Name: (.*?)\n"
+    for task_id, question, file_name in re.findall(pattern, content, re.DOTALL):
+        if task_id not in questions:
+            questions[task_id] = {"task_id": task_id, "question": question, "file_name": None if file_name == "No file" else file_name}
+
+    return list(questions.values())
+
+
+def question_shape(question: dict) -> str:
+
+    file_name = question["file_name"] or ""
+    if "youtube.com" in question["question"]:
+        return "youtube"
+    if file_name.endswith((".png", ".jpg", ".jpeg")):
+        return "image"
+    if file_name.endswith((".xlsx", ".xls", ".csv")):
+        return "table"
+    if file_name.endswith(".mp3"):
+        return "audio"
+    if file_name:
+        return "file"
+    return "text"
+
+
+def create_attachments() -> dict[str, str]:
+    """Creates synthetic attachments for each shape, returns file names relative to tmp"""
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+
+    image = Image.new("RGB", (1600, 1600), "white")
+    for i in range(8):
+        for j in range(8):
+            if (i + j) % 2:
+                image.paste((110, 80, 50), (i * 200, j * 200, (i + 1) * 200, (j + 1) * 200))
+    image.save(os.path.join(BENCHMARK_DIR, "image.png"))
+
+    pd.DataFrame({
+        "Location": [f"Store {i % 9}" for i in range(500)],
+        "Burgers": range(500),
+        "Soda": [i * 0.5 for i in range(500)],
+    }).to_excel(os.path.join(BENCHMARK_DIR, "table.xlsx"), index=False)
+
+    with open(os.path.join(BENCHMARK_DIR, "audio.mp3"), "wb") as f:
+        f.write(b"\0" * 1024)
+
+    with open(os.path.join(BENCHMARK_DIR, "code.py"), "w") as f:
+        f.write("def f(x):\n    return x * 2\n\nprint(f(21))\n")
+
+    return {"image": "benchmark/image.png", "table": "benchmark/table.xlsx", "audio": "benchmark/audio.mp3", "file": "benchmark/code.py"}
+
+
+### Benchmark run
+
+async def run_benchmark(args) -> dict:
+
+    def create_model(provider: str, model: str) -> ScriptedChatModel:
+        fast = (provider, model) in models.FAST_NODE_MODELS.values()
+        return ScriptedChatModel(latency=args.fast_llm_latency if fast else args.llm_latency, cache=False)
+
+    models.set_model_factory(create_model)
+
+    attachments = create_attachments()
+    questions = load_questions(args.questions) * args.repeat
+
+    # Read by stub server (passed to its process with the environment)
+    os.environ["BENCHMARK_TOOL_LATENCY"] = json.dumps(args.tool_latency)
+
+    recorder = BenchmarkRecorder()
+    tasks = []
+
+    async with open_mcp_tools(workers=args.mcp_workers, server_script="./benchmark_mcp_server.py") as tools:
+
+        compiled_graph = build_graph(tools)
+
+        if args.allocations:
+            tracemalloc.start()
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def run_one(index: int, question: dict):
+            shape = question_shape(question)
+            task_id = f"{question['task_id']}#{index}"
+
+            async with semaphore:
+                if args.allocations and args.concurrency == 1:
+                    tracemalloc.reset_peak()
+                    baseline, _ = tracemalloc.get_traced_memory()
+
+                start = time.perf_counter()
+                error = None
+                try:
+                    await compiled_graph.ainvoke(
+                        build_task_input(question["question"], task_id, attachments.get(shape)),
+                        {
+                            "recursion_limit": 30,
+                            "callbacks": [recorder],
+                            "metadata": {"task_id": task_id},
+                            "configurable": {"tools": tools},
+                        },
+                    )
+                except Exception as e:
+                    error = repr(e)
+                duration = time.perf_counter() - start
+
+                peak_kb = None
+                if args.allocations and args.concurrency == 1:
+                    _, peak = tracemalloc.get_traced_memory()
+                    peak_kb = (peak - baseline) / 1024
+
+            tasks.append({
+                "task_id": task_id,
+                "shape": shape,
+                "duration_ms": duration * 1000,
+                "graph_steps": recorder.task_steps[task_id],
+                "prompt_chars": recorder.task_prompt_chars[task_id],
+                "peak_alloc_kb": peak_kb,
+                "error": error,
+            })
+
+        total_start = time.perf_counter()
+        await asyncio.gather(*(run_one(i, question) for i, question in enumerate(questions)))
+        total_duration = time.perf_counter() - total_start
+
+        if args.allocations:
+            tracemalloc.stop()
+
+    # Only finished tasks are latency samples
+    finished = [task for task in tasks if task["error"] is None]
+
+    shapes = defaultdict(list)
+    for task in finished:
+        shapes[task["shape"]].append(task["duration_ms"] / 1000)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "llm_latency_s": args.llm_latency,
+            "fast_llm_latency_s": args.fast_llm_latency,
+            "tool_latency_s": args.tool_latency,
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "allocations_traced": args.allocations,
+        },
+        "total_duration_ms": total_duration * 1000,
+        "errors": len(tasks) - len(finished),
+        "task_latency_ms": percentiles([task["duration_ms"] / 1000 for task in finished]),
+        "shape_latency_ms": {shape: percentiles(values) for shape, values in shapes.items()},
+        "node_latency_ms": {node: percentiles(values) for node, values in recorder.node_durations.items()},
+        "tool_latency_ms": {tool: percentiles(values) for tool, values in recorder.tool_durations.items()},
+        "prompt_chars": {node: percentiles(values, scale=1) for node, values in recorder.prompt_chars.items()},
+        "shared_prefix_chars": {node: percentiles(values, scale=1) for node, values in recorder.shared_prefix_chars.items()},
+        "tasks": tasks,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: dict | None = None) -> None:
+    """Prints p50/p90 latencies, with change against baseline results (if provided)"""
+
+    def line(name, stats, baseline_stats):
+        if not stats.get("count"):
+            return
+        text = f"{name:<30} n={stats['count']:<5} p50={stats['p50']:>9.1f}  p90={stats['p90']:>9.1f}"
+        if baseline_stats and baseline_stats.get("count"):
+            text += f"  (p50 {stats['p50'] - baseline_stats['p50']:+.1f}, p90 {stats['p90'] - baseline_stats['p90']:+.1f})"
+        print(text)
+
+    baseline = baseline or {}
+
+    print(f"Commit {results['commit']}, total {results['total_duration_ms']:.0f} ms")
+    for task in results["tasks"]:
+        if task["error"]:
+            print(f"FAILED {task['task_id']} ({task['shape']}): {task['error']}")
+    line("task", results["task_latency_ms"], baseline.get("task_latency_ms"))
+    for group in ["shape_latency_ms", "node_latency_ms", "tool_latency_ms", "prompt_chars", "shared_prefix_chars"]:
+        print(f"--- {group}")
+        for name, stats in sorted(results.get(group, {}).items()):
+            line(name, stats, baseline.get(group, {}).get(name))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the agent graph")
+    parser.add_argument("--questions", default="questions.txt")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs of every question")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--mcp-workers", type=int, default=1, help="Number of MCP server processes (see mcp_pool.py)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Latency of every large model call in seconds")
+    parser.add_argument("--fast-llm-latency", type=float, default=0.02, help="Latency of every fast model call in seconds")
+    parser.add_argument("--tool-latency", type=json.loads, default={}, help='JSON with tool latencies, e.g. {"websearch": 0.5}')
+    parser.add_argument("--no-allocations", dest="allocations", action="store_false", help="Do not trace allocations (more precise timing)")
+    parser.add_argument("--output", default=os.path.join(BENCHMARK_DIR, "results.json"))
+    parser.add_argument("--baseline", help="Results of previous run to compare with")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_report(results, baseline)
+    print(f"Results saved to {args.output}")
+
+    if results["errors"]:
+        sys.exit(f"{results['errors']} of {len(results['tasks'])} tasks failed")
@@ -0,0 +1,96 @@
+import os
+import json
+import asyncio
+import argparse
+
+from mcp.server.fastmcp import FastMCP
+
+
+### Stub MCP server for benchmark
+# - Same tools as mcp_server.py without any network or heavy work
+# - Latency of each tool (seconds) configurable by BENCHMARK_TOOL_LATENCY, e.g. {"websearch": 0.5}
+# - Size of returned text configurable by BENCHMARK_TOOL_OUTPUT_CHARS
+
+DEFAULT_LATENCY = {
+    "transcribe_audio": 0.2,
+    "transcribe_video": 0.2,
+    "search_video_transcript": 0.01,
+    "websearch": 0.1,
+    "wiki_search": 0.1,
+    "arxiv_search": 0.1,
+    "python_repl": 0.02,
+    "query_table": 0.01,
+}
+
+latency = {**DEFAULT_LATENCY, **json.loads(os.environ.get("BENCHMARK_TOOL_LATENCY", "{}"))}
+output_chars = int(os.environ.get("BENCHMARK_TOOL_OUTPUT_CHARS", "2000"))
+
+mcp = FastMCP("HF_Agents_Tools_Benchmark", log_level="WARNING")
+
+
+async def respond(tool_name: str, argument: str) -> str:
+    """Waits for configured latency and returns text of configured size"""
+
+    await asyncio.sleep(latency.get(tool_name, 0))
+
+    paragraph = f"Result of {tool_name} for '{argument[:100]}'. "
+    text = ""
+    while len(text) < output_chars:
+        text += paragraph + f"Fact number {len(text) // len(paragraph)}.\n"
+    return text[:output_chars]
+
+
+@mcp.tool()
+async def transcribe_audio(audio_file: str, with_timestamps: bool = False) -> str:
+    """Transcribes audio file into text"""
+    return await respond("transcribe_audio", audio_file)
+
+@mcp.tool()
+async def transcribe_video(video_url: str) -> str:
+    """Transcribes YouTube video into text"""
+    return await respond("transcribe_video", video_url)
+
+@mcp.tool()
+async def search_video_transcript(video_url: str, keyword: str = "", start_time: str = "", end_time: str = "") -> str:
+    """Returns parts of YouTube video transcript with timestamps"""
+    return await respond("search_video_transcript", f"{video_url} {keyword} {start_time}-{end_time}")
+
+@mcp.tool()
+async def websearch(websearch_query: str) -> str:
+    """Searches the web"""
+    return await respond("websearch", websearch_query)
+
+@mcp.tool()
+async def wiki_search(wiki_search_query: str) -> str:
+    """Searches Wikipedia for topic."""
+    return await respond("wiki_search", wiki_search_query)
+
+@mcp.tool()
+async def arxiv_search(arxiv_search_query: str) -> str:
+    """Searches for studies in Arxiv on topic."""
+    return await respond("arxiv_search", arxiv_search_query)
+
+@mcp.tool()
+async def python_repl(python_code: str) -> str:
+    """A Python shell. Use this to execute python commands."""
+    return await respond("python_repl", python_code)
+
+@mcp.tool()
+async def query_table(file_name: str, filter_expression: str = "", columns: list[str] | None = None,
+                      group_by: list[str] | None = None, aggregation: str = "", limit: int = 50) -> str:
+    """Queries table from attached spreadsheet or CSV file."""
+    return await respond("query_table", file_name)
+
+
+if __name__ == "__main__":
+    # Same arguments as mcp_server.py, so it can run as worker of server pool
+    parser = argparse.ArgumentParser(description="Stub MCP server for benchmark")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+
+    mcp.run(transport=args.transport)
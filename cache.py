@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+from pydantic import BaseModel
+
+
+### Disk cache
+# - Key-value store in SQLite shared by all caches
+# - Expiration by age (TTL) and eviction of least recently used entries
+
+class DiskCache:
+    """SQLite key-value store with TTL and size based eviction"""
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 10000, ttl: Optional[float] = None):
+
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Nodes run in worker threads, connection is shared and guarded by lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        """Returns stored value or None if missing or expired"""
+
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if ttl is not None and now - created_at > ttl:
+                self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._connection.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """Stores value and evicts least recently used entries over the limit"""
+
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._connection.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def items(self) -> list[tuple[str, str]]:
+        """All stored (key, value) pairs, oldest first"""
+
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT key, value FROM {self.table} ORDER BY created_at"
+            ).fetchall()
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+def hash_key(*parts: str) -> str:
+    """Content-addressed key from provided parts"""
+
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+### LLM response cache
+# - Plugged under all chat models via langchain global cache
+# - Key contains model/deployment and call parameters (bound tools, structured output schema) and serialized messages
+# - Parsed structured output is stored as plain dict (parser of structured output accepts both), unreadable entries are misses
+
+class LLMResponseCache(BaseCache):
+    """Persistent cache of chat model responses"""
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: Optional[float] = None):
+        self.store = DiskCache(path, table="llm_cache", max_entries=max_entries, ttl=ttl)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.store.get(hash_key(llm_string, prompt))
+        if value is None:
+            return None
+        try:
+            return loads(value)
+        except Exception:
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.store.set(hash_key(llm_string, prompt), dumps([_without_pydantic(generation) for generation in return_val]))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+def _without_pydantic(generation):
+    """Generation with parsed structured output (pydantic object, not serializable by dumps) replaced by dict"""
+
+    message = getattr(generation, "message", None)
+    parsed = message.additional_kwargs.get("parsed") if message is not None else None
+    if not isinstance(parsed, BaseModel):
+        return generation
+
+    additional_kwargs = {**message.additional_kwargs, "parsed": parsed.model_dump(mode="json")}
+    return generation.model_copy(update={"message": message.model_copy(update={"additional_kwargs": additional_kwargs})})
+
+
+def enable_llm_cache() -> LLMResponseCache | None:
+    """
+    Turns on LLM response cache if enabled by environment variable LLM_CACHE.
+    Returns used cache (for statistics) or None.
+    """
+
+    if os.environ.get("LLM_CACHE", "false").lower() not in ("1", "true", "yes"):
+        return None
+
+    ttl = os.environ.get("LLM_CACHE_TTL")
+
+    llm_cache = LLMResponseCache(
+        path=os.environ.get("LLM_CACHE_PATH", os.path.join("tmp", "llm_cache.sqlite")),
+        max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(ttl) if ttl else None,
+    )
+    set_llm_cache(llm_cache)
+
+    return llm_cache
+
+
+### Tool result cache
+# - Used by MCP server for search tools
+# - Small in-memory LRU in front of persistent disk cache, TTL per tool
+
+def normalize_query(query: str) -> str:
+    """Normalizes search query, so equivalent queries share one cache entry"""
+
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" \t\n\"'.,;:!?")
+
+
+def _single_argument(args: tuple, kwargs: dict) -> str:
+    """Query of a tool called either positionally or by keyword (MCP server)"""
+
+    if args:
+        return str(args[0])
+    return str(next(iter(kwargs.values())))
+
+
+class ToolResultCache:
+    """Two level cache of tool results keyed by tool name and normalized query"""
+
+    def __init__(self, path: str, ttls: Optional[dict[str, float]] = None, default_ttl: float = 24 * 3600,
+                 memory_entries: int = 256, max_entries: int = 10000):
+
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.memory_entries = memory_entries
+
+        self.store = DiskCache(path, table="tool_cache", max_entries=max_entries)
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def _count(self, tool_name: str, event: str) -> None:
+        tool_stats = self._stats.setdefault(tool_name, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        tool_stats[event] += 1
+
+    def get(self, tool_name: str, query: str, source: str = "") -> Optional[str]:
+        """Returns cached result or None if missing or expired"""
+
+        key = hash_key(tool_name, *([source] if source else []), normalize_query(query))
+        ttl = self.ttls.get(tool_name, self.default_ttl)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= ttl:
+                self._memory.move_to_end(key)
+                self._count(tool_name, "memory_hits")
+                return entry[1]
+
+        value = self.store.get(key, ttl=ttl)
+        if value is None:
+            with self._lock:
+                self._memory.pop(key, None)
+                self._count(tool_name, "misses")
+            return None
+
+        entry = json.loads(value)
+        with self._lock:
+            self._remember(key, entry["created_at"], entry["result"])
+            self._count(tool_name, "disk_hits")
+        return entry["result"]
+
+    def set(self, tool_name: str, query: str, result: str, source: str = "") -> None:
+
+        key = hash_key(tool_name, *([source] if source else []), normalize_query(query))
+        now = time.time()
+
+        self.store.set(key, json.dumps({"created_at": now, "result": result}))
+        with self._lock:
+            self._remember(key, now, result)
+
+    def _remember(self, key: str, created_at: float, result: str) -> None:
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def cached(self, tool_name: str, source: Callable[[], str] | None = None) -> Callable:
+        """
+        Decorator caching results of a tool with single query argument.
+        Optional source returns identifier of the data the tool reads (e.g. snapshot), results of other sources are not reused.
+        """
+
+        def decorator(func: Callable) -> Callable:
+
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs) -> str:
+                    query = _single_argument(args, kwargs)
+                    source_id = source() if source else ""
+                    result = self.get(tool_name, query, source_id)
+                    if result is None:
+                        result = await func(*args, **kwargs)
+                        self.set(tool_name, query, result, source_id)
+                    return result
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs) -> str:
+                query = _single_argument(args, kwargs)
+                source_id = source() if source else ""
+                result = self.get(tool_name, query, source_id)
+                if result is None:
+                    result = func(*args, **kwargs)
+                    self.set(tool_name, query, result, source_id)
+                return result
+            return wrapper
+
+        return decorator
+
+    def stats(self) -> dict:
+        with self._lock:
+            tools = {tool_name: dict(tool_stats) for tool_name, tool_stats in self._stats.items()}
+            memory_entries = len(self._memory)
+        return {"memory_entries": memory_entries, "disk": self.store.stats(), "tools": tools}
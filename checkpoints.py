@@ -0,0 +1,48 @@
+import os
+import json
+import time
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from cache import DiskCache
+
+
+### Durable runs
+# - Graph state is checkpointed after every super-step into SQLite (thread ID = task ID)
+# - Answers of finished tasks are stored by task ID, so a rerun skips them
+
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", os.path.join("tmp", "checkpoints.sqlite"))
+RESULTS_PATH = os.environ.get("RESULTS_PATH", os.path.join("tmp", "results.sqlite"))
+
+# Continue unfinished tasks and skip answered ones (false starts all tasks from scratch)
+RESUME = os.environ.get("RESUME", "true").lower() in ("1", "true", "yes")
+
+
+def open_checkpointer(path: str = CHECKPOINT_PATH):
+    """Async context manager with SQLite checkpointer"""
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    return AsyncSqliteSaver.from_conn_string(path)
+
+
+class ResultsStore:
+    """Answers of finished tasks by task ID"""
+
+    def __init__(self, path: str = RESULTS_PATH):
+        self.store = DiskCache(path, table="results", max_entries=1_000_000)
+
+    def get(self, task_id: str) -> str | None:
+        value = self.store.get(task_id)
+        return json.loads(value)["answer"] if value else None
+
+    def set(self, task_id: str, answer: str) -> None:
+        self.store.set(task_id, json.dumps({"answer": answer, "finished_at": time.time()}))
+
+    def answers(self) -> dict[str, str]:
+        return {task_id: json.loads(value)["answer"] for task_id, value in self.store.items()}
+
+    def clear(self) -> None:
+        self.store.clear()
@@ -0,0 +1,134 @@
+import os
+import re
+import math
+from collections import Counter
+
+
+### Knowledge store
+# - Tool outputs are split into deduplicated chunks
+# - Only chunks relevant to the current step (BM25 ranking) are put into the prompt within token budget
+
+KNOWLEDGE_TOKEN_BUDGET = int(os.environ.get("KNOWLEDGE_TOKEN_BUDGET", "3000"))
+KNOWLEDGE_TOP_K = int(os.environ.get("KNOWLEDGE_TOP_K", "8"))
+CHUNK_TOKENS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+
+    return len(text) // 4 + 1
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def split_pieces(text: str, chunk_tokens: int = CHUNK_TOKENS) -> list[str]:
+    """Splits text into paragraphs, too long paragraphs into sentences or fixed size parts"""
+
+    max_chars = chunk_tokens * 4
+
+    pieces = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    return pieces
+
+
+def merge_pieces(pieces: list[str], chunk_tokens: int = CHUNK_TOKENS) -> list[str]:
+    """Merges neighbouring pieces into chunks of roughly chunk_tokens tokens"""
+
+    max_chars = chunk_tokens * 4
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def add_knowledge(chunks: list[str], text: str) -> list[str]:
+    """Returns chunks extended by chunks made of new, not yet known paragraphs of the text"""
+
+    known = {" ".join(tokenize(piece)) for chunk in chunks for piece in chunk.split("\n")}
+
+    new_pieces = []
+    for piece in split_pieces(text):
+        fingerprint = " ".join(tokenize(piece))
+        if fingerprint and fingerprint not in known:
+            known.add(fingerprint)
+            new_pieces.append(piece)
+
+    return chunks + merge_pieces(new_pieces)
+
+
+class BM25:
+    """Okapi BM25 ranking over small in-memory collection"""
+
+    def __init__(self, documents: list[list[str]], k1: float = 1.5, b: float = 0.75):
+
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+
+        document_frequencies = Counter(term for frequencies in self.term_frequencies for term in frequencies)
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+    def scores(self, query: list[str]) -> list[float]:
+
+        scores = []
+        for frequencies, length in zip(self.term_frequencies, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            for term in set(query):
+                frequency = frequencies.get(term, 0)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+
+        return scores
+
+
+def select_knowledge(chunks: list[str], query: str, token_budget: int = KNOWLEDGE_TOKEN_BUDGET,
+                     top_k: int = KNOWLEDGE_TOP_K) -> str:
+    """Returns most relevant chunks for the query that fit into token budget, in original order"""
+
+    if not chunks:
+        return ""
+
+    scores = BM25([tokenize(chunk) for chunk in chunks]).scores(tokenize(query))
+
+    # Most relevant first, newer chunks win on equal score
+    ranking = sorted(range(len(chunks)), key=lambda i: (scores[i], i), reverse=True)
+
+    selected = []
+    used_tokens = 0
+    for i in ranking:
+        if len(selected) >= top_k:
+            break
+        tokens = estimate_tokens(chunks[i])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(i)
+        used_tokens += tokens
+
+    return "\n\n".join(chunks[i] for i in sorted(selected))
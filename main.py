@@ -14,8 +14,13 @@ from planner import *
 from assistant import *
 from  validator import *
 from replanner import *
+from cache import enable_llm_cache
 
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
+# LangSmith tracing, can be turned off by LANGCHAIN_TRACING_V2=false (local metrics see METRICS)
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
+
+# Optional disk cache of LLM responses (see LLM_CACHE in README)
+llm_cache = enable_llm_cache()
 
 
 ### Graph Definition ###
@@ -66,8 +71,11 @@ for question, task_id, file_name in question_generator:
 
     file_content = None
     file_type = None
+    file_data_url = None
     if file_name:
         file_type, file_content = read_file(file_name)
+        if file_type == "image":
+            file_data_url = encode_image(file_content)
 
     task_answer = None
 
@@ -81,12 +89,13 @@ for question, task_id, file_name in question_generator:
                     "file_name": file_name,
                     "file_type": file_type,
                     "file_content": file_content,
+                    "file_data_url": file_data_url,
                     "answer": "",
                     "tool_messages": [],
                     "assistant_messages": [],
-                    "collected_knowledge": ""
+                    "collected_knowledge": []
                 },
-                {"recursion_limit": 30},
+                {"recursion_limit": 30, "configurable": {"tools": tools}},
             )
         except GraphRecursionError as e:
             print("Recursion error, trying again...")
@@ -122,4 +131,7 @@ for question, task_id, file_name in question_generator:
 
 # all_submission_data = {"username": "jarisko", "agent_code": "https://github.com/jarisko1/hf_agents_course_final", "answers": all_answers_payload}
 # final_status = submit_answer(all_submission_data)
-# print(final_status)
\ No newline at end of file
+# print(final_status)
+
+if llm_cache:
+    print("LLM cache:", llm_cache.stats())
@@ -6,154 +6,249 @@ from langgraph.errors import GraphRecursionError
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode, tools_condition
 
-from langchain_mcp_adapters.client import MultiServerMCPClient
-
 
 load_dotenv()
 
 from utils import *
-from tools import *
 from state import *
 from planner import *
 from assistant import *
 from  validator import *
 from replanner import *
+from tools_node import create_tools_node, stagnation_condition
+from cache import enable_llm_cache
+from metrics import create_metrics_collector
+from checkpoints import open_checkpointer, ResultsStore, RESUME
+from streaming import stream_task, format_event
+from submission import SubmissionQueue
+from mcp_pool import open_mcp_tools
+
+# LangSmith tracing, can be turned off by LANGCHAIN_TRACING_V2=false (local metrics see METRICS)
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
 
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
-
-
-async def call_model():
-
-    async with MultiServerMCPClient(
-        {
-            "hf_agents_tools": {
-                "command": "python",
-                "args": ["./mcp_server.py"],
-                "transport": "stdio",
-            },
-            # "tavily_mcp": {
-            #     "command": "python",
-            #     "args": ["./test_mcp/tavily_mcp.py"],
-            #     "transport": "stdio",
-            # },
-        } # type: ignore
-    ) as client:
-
-        tools = client.get_tools()
-
-
-        ### Graph Definition ###
-
-        # Create the graph
-        task_graph = StateGraph(TaskState)
-
-        # Add nodes
-        task_graph.add_node("planner", planner)
-        task_graph.add_node("replanner", replanner)
-        task_graph.add_node("validator", validator)
-        task_graph.add_node("assistant", assistant)
-        task_graph.add_node("tools", ToolNode(
-            tools=tools,
-            name="tools",
-            messages_key="tool_messages"
-        ))
-
-        # Add edges
-        task_graph.add_edge(START, "planner")
-        task_graph.add_edge("planner", "assistant")
-        task_graph.add_conditional_edges("assistant", tools_or_replanner_condition, ["tools", "replanner"]) # Continue with tools or proceed to replanner
-        task_graph.add_edge("tools", "assistant")
-        task_graph.add_conditional_edges("replanner", answer_provided_condition, ["validator", "assistant"]) # Validate answer continue working
-        task_graph.add_conditional_edges("validator", validator_approval_condition, ["replanner", END]) # Go to END or back to assistant for rework
-
-        compiled_graph = task_graph.compile()
-
-        # from IPython.display import display, Image
-        # display(Image(compiled_graph.get_graph(xray=True).draw_mermaid_png()))
-
-
-        ### Execution ###
-
-        question_generator = get_question(random=False)
-        all_answers_payload = []
-
-        for question, task_id, file_name in question_generator:
-
-            # if task_id != "cca530fc-4052-43b2-b130-b30968d8aa44":
-            #     continue
-
-            answers_payload = []
-
-            print("Task ID:", task_id)
-            print("Question:", question)
-            print("File Name:", file_name or "No file")
-
-            file_content = None
-            file_type = None
-            if file_name:
-                file_type, file_content = read_file(file_name)
-
-            task_answer = None
-
-            # Try multiple times
-            for i in range(1):
-                try:
-                    task_answer = await compiled_graph.ainvoke(
-                        {
-                            "question": question,
-                            "task_id": "1",
-                            "file_name": file_name,
-                            "file_type": file_type,
-                            "file_content": file_content,
-                            "tools_list": tools,
-                            "answer": "",
-                            "tool_messages": [],
-                            "assistant_messages": [],
-                            "collected_knowledge": ""
-                        },
-                        {"recursion_limit": 30},
-                    )
-                except GraphRecursionError as e:
-                    print("Recursion error, trying again...")
-                    continue
-                except Exception as e:
-                    print("Other error, skipping question\nError details:", e)
-                    break
-                break
-
-            if task_answer:
-                print("Answer:", task_answer["answer"])
-                print("-" * 50)
-
-                # answers_payload.append({"task_id": task_id, "submitted_answer": task_answer["answer"]})
-                answers_payload = [{"task_id": task_id, "submitted_answer": task_answer["answer"]}]
-                all_answers_payload.extend(answers_payload)
-
-                # TODO: Copy the final implementation to a Hugging Face space
-                submission_data = {"username": "jarisko", "agent_code": "https://github.com/jarisko1/agents_mcp_langgraph", "answers": answers_payload}
-
-                final_status = submit_answer(submission_data)
-                print(final_status)
-                print("=" * 100)
-
-            else:
-                print("No answer produced")
-                print("=" * 100)
-
+# Optional disk cache of LLM responses (see LLM_CACHE in README)
+llm_cache = enable_llm_cache()
+
+# Optional local metrics (see METRICS in README)
+metrics = create_metrics_collector()
+
+
+USERNAME = "jarisko"
+AGENT_CODE = "https://github.com/jarisko1/agents_mcp_langgraph"
+
+# Number of tasks processed at the same time in batch mode
+MAX_CONCURRENT_TASKS = int(os.environ.get("MAX_CONCURRENT_TASKS", "4"))
+
+
+### Graph Definition ###
+
+def build_graph(tools, checkpointer=None):
+    """Builds and compiles the task graph using provided MCP tools"""
+
+    # Create the graph
+    task_graph = StateGraph(TaskState)
+
+    # Add nodes
+    task_graph.add_node("planner", planner)
+    task_graph.add_node("replanner", replanner)
+    task_graph.add_node("validator", validator)
+    task_graph.add_node("assistant", assistant)
+    task_graph.add_node("tools", create_tools_node(tools)) # Runs parallel tool calls concurrently
+
+    # Add edges
+    task_graph.add_edge(START, "planner")
+    task_graph.add_edge("planner", "assistant")
+    task_graph.add_conditional_edges("assistant", tools_or_replanner_condition, ["tools", "replanner"]) # Continue with tools or proceed to replanner
+    task_graph.add_conditional_edges("tools", stagnation_condition, ["assistant", "replanner"]) # Stop looping when tools bring no new information
+    task_graph.add_conditional_edges("replanner", answer_provided_condition, ["validator", "assistant"]) # Validate answer continue working
+    task_graph.add_conditional_edges("validator", validator_approval_condition, ["replanner", END]) # Go to END or back to assistant for rework
+
+    # from IPython.display import display, Image
+    # display(Image(compiled_graph.get_graph(xray=True).draw_mermaid_png()))
+
+    return task_graph.compile(checkpointer=checkpointer)
+
+
+### Execution ###
+
+def build_task_input(question: str, task_id: str, file_name: str | None) -> TaskState:
+    """Loads attachment and returns initial state of the task"""
+
+    file_content = None
+    file_type = None
+    file_data_url = None
+    if file_name:
+        file_type, file_content = read_file(file_name)
+        if file_type == "image":
+            file_data_url = encode_image(file_content)
+
+    # Fresh input for every task, nodes extend the message lists in place
+    return {
+        "question": question,
+        "task_id": task_id,
+        "file_name": file_name,
+        "file_type": file_type,
+        "file_content": file_content,
+        "file_data_url": file_data_url,
+        "answer": "",
+        "tool_messages": [],
+        "assistant_messages": [],
+        "collected_knowledge": [],
+        "tool_results": {},
+        "stagnant_iterations": 0,
+        "escalated": False
+    }
+
+
+def build_task_config(task_id: str, tools) -> dict:
+    """Returns run configuration of the task (tools are passed here, they can't be checkpointed)"""
+
+    return {
+        "recursion_limit": 30,
+        "callbacks": [metrics] if metrics else [],
+        "metadata": {"task_id": task_id},
+        "configurable": {"thread_id": task_id, "tools": tools},
+    }
+
+
+async def run_task(compiled_graph, tools, question: str, task_id: str, file_name: str | None,
+                   results: ResultsStore | None = None) -> str | None:
+    """Runs the graph for a single task and returns the answer (if any)"""
+
+    # Answered in previous run
+    if results and RESUME:
+        answer = results.get(task_id)
+        if answer:
+            print(f"[{task_id}] Already answered: {answer}")
+            return answer
+
+    config = build_task_config(task_id, tools)
+    task_answer = None
+
+    # Try multiple times
+    for i in range(1):
+        try:
+            # Reading attachment (table conversion, image resize) runs in thread, other tasks continue meanwhile
+            graph_input = await asyncio.to_thread(build_task_input, question, task_id, file_name)
+
+            if compiled_graph.checkpointer:
+                snapshot = await compiled_graph.aget_state(config)
+                if RESUME and snapshot.next:
+                    # Continue unfinished run from the last checkpoint
+                    print(f"[{task_id}] Resuming from checkpoint before {', '.join(snapshot.next)}")
+                    graph_input = None
+                else:
+                    # Start from scratch without state of previous runs
+                    await compiled_graph.checkpointer.adelete_thread(task_id)
+
+            # Print progress of the task as it happens
+            async for event in stream_task(compiled_graph, graph_input, config):
+                print(format_event(event))
+                if event["kind"] == "answer":
+                    task_answer = event["answer"]
+        except GraphRecursionError as e:
+            print(f"[{task_id}] Recursion error, trying again...")
+            continue
+        except TimeoutError as e:
+            print(f"[{task_id}] {e}, skipping question")
+            break
+        except Exception as e:
+            print(f"[{task_id}] Other error, skipping question\nError details:", e)
             break
+        break
+
+    if task_answer and results:
+        results.set(task_id, task_answer)
+
+    # Print the whole task summary at once, so concurrent tasks do not interleave
+    report = (
+        f"Task ID: {task_id}\n"
+        f"Question: {question}\n"
+        f"File Name: {file_name or 'No file'}\n"
+    )
+    if task_answer:
+        report += f"Answer: {task_answer}\n"
+    else:
+        report += "No answer produced\n"
+    print(report + "=" * 100)
+
+    return task_answer or None
+
+
+async def run_batch(compiled_graph, tools, tasks, max_concurrency: int = MAX_CONCURRENT_TASKS,
+                    results: ResultsStore | None = None, submissions: SubmissionQueue | None = None) -> list[dict]:
+    """
+    Runs all tasks concurrently against one compiled graph.
+    Tasks can be a list or an async iterator (tasks start as soon as they arrive).
+    At most `max_concurrency` tasks are processed at the same time.
+    Answers are queued for submission as soon as they are produced.
+    Returns answers payload in the order in which tasks were provided.
+    """
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def limited_task(question, task_id, file_name):
+        async with semaphore:
+            answer = await run_task(compiled_graph, tools, question, task_id, file_name, results)
+        if answer and submissions:
+            submissions.put(task_id, answer)
+        return task_id, answer
+
+    running = []
+    if hasattr(tasks, "__aiter__"):
+        async for question, task_id, file_name in tasks:
+            running.append(asyncio.create_task(limited_task(question, task_id, file_name)))
+    else:
+        for question, task_id, file_name in tasks:
+            running.append(asyncio.create_task(limited_task(question, task_id, file_name)))
+
+    answers = await asyncio.gather(*running)
+
+    return [
+        {"task_id": task_id, "submitted_answer": answer}
+        for task_id, answer in answers
+        if answer
+    ]
+
+
+async def call_model(max_concurrency: int = MAX_CONCURRENT_TASKS):
+
+    # Answers of finished tasks and answers queued for submission, kept across runs
+    results = ResultsStore()
+    submissions = SubmissionQueue(USERNAME, AGENT_CODE)
+    if not RESUME:
+        # Answers of previous runs are neither reused nor submitted again
+        results.clear()
+        submissions.clear()
+
+    # Single stdio server or pool of server workers (MCP_WORKERS)
+    async with open_mcp_tools() as tools, open_checkpointer() as checkpointer, submissions:
+
+        compiled_graph = build_graph(tools, checkpointer)
+
+        # Attachments are downloaded in the background, tasks without file start right away
+        tasks = aiter_questions(random=False)
+
+        # tasks = [task for task in await prefetch_questions(random=False) if task[1] == "cca530fc-4052-43b2-b130-b30968d8aa44"]
+
+        all_answers_payload = await run_batch(compiled_graph, tools, tasks, max_concurrency, results, submissions)
+
 
+        ### Submit remaining answers ###
 
+        print(f"Submitting remaining {submissions.pending()} answers")
+        final_status = await submissions.flush()
+        print(final_status)
 
-        ### Submit all produced answers ###
+        if llm_cache:
+            print("LLM cache:", llm_cache.stats())
 
-        # print("=" * 100)
-        # all_submission_data = {"username": "jarisko", "agent_code": "https://github.com/jarisko1/agents_mcp_langgraph", "answers": all_answers_payload}
-        # final_status = submit_answer(all_submission_data)
-        # print(final_status)
+        if metrics:
+            metrics.export()
 
         return all_answers_payload
 
 
 if __name__ == "__main__":
     result = asyncio.run(call_model())
-    print(result)
\ No newline at end of file
+    print(result)
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+from contextlib import asynccontextmanager, AsyncExitStack
+
+from langchain_core.tools import BaseTool, StructuredTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+
+### MCP server pool
+# - With MCP_WORKERS > 1, tool server runs as pool of worker processes behind local streamable-HTTP endpoints
+# - Every tool is pooled - each call goes to the least busy worker, so one slow call does not hold up the others
+# - With single worker the server runs over stdio as before
+
+MCP_WORKERS = int(os.environ.get("MCP_WORKERS", "1"))
+MCP_BASE_PORT = int(os.environ.get("MCP_BASE_PORT", "8765"))
+MCP_HOST = "127.0.0.1"
+
+# Seconds to wait until worker accepts connections
+WORKER_STARTUP_TIMEOUT = 60
+
+
+def start_workers(workers: int, base_port: int = MCP_BASE_PORT, server_script: str = "./mcp_server.py") -> list[subprocess.Popen]:
+    """Starts server workers on consecutive ports and waits until they accept connections"""
+
+    env = {**os.environ}
+    env.setdefault("FASTMCP_LOG_LEVEL", "WARNING") # No access log of every tool call
+
+    processes = [
+        subprocess.Popen(
+            [sys.executable, server_script, "--transport", "streamable-http", "--host", MCP_HOST, "--port", str(base_port + i)],
+            env=env,
+        )
+        for i in range(workers)
+    ]
+
+    try:
+        for i, process in enumerate(processes):
+            _wait_for_port(process, base_port + i)
+    except Exception:
+        stop_workers(processes)
+        raise
+
+    return processes
+
+
+def _wait_for_port(process: subprocess.Popen, port: int, timeout: float = WORKER_STARTUP_TIMEOUT) -> None:
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"MCP worker on port {port} exited with code {process.returncode}")
+        try:
+            with socket.create_connection((MCP_HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+
+    raise TimeoutError(f"MCP worker on port {port} did not start in {timeout} s")
+
+
+def stop_workers(processes: list[subprocess.Popen]) -> None:
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def client_config(workers: int, base_port: int = MCP_BASE_PORT, server_script: str = "./mcp_server.py") -> dict:
+    """MultiServerMCPClient configuration - single stdio server or one HTTP connection per worker"""
+
+    if workers <= 1:
+        return {
+            "hf_agents_tools": {
+                "command": sys.executable, # Same interpreter (and virtual environment) as the agent
+                "args": [server_script],
+                "env": {**os.environ}, # Same configuration as HTTP workers (stdio client passes only a minimal environment otherwise)
+                "transport": "stdio",
+            },
+            # "tavily_mcp": {
+            #     "command": "python",
+            #     "args": ["./test_mcp/tavily_mcp.py"],
+            #     "transport": "stdio",
+            # },
+        }
+
+    return {
+        f"hf_agents_tools_{i}": {
+            "url": f"http://{MCP_HOST}:{base_port + i}/mcp",
+            "transport": "streamable_http",
+        }
+        for i in range(workers)
+    }
+
+
+def pool_tools(server_name_to_tools: dict[str, list[BaseTool]]) -> list[BaseTool]:
+    """
+    Merges same tools of all workers into one tool each.
+    A call goes to the worker with the fewest running calls (then the least used one).
+    """
+
+    workers = list(server_name_to_tools)
+    running = {worker: 0 for worker in workers}
+    dispatched = {worker: 0 for worker in workers}
+
+    def pooled(name: str) -> BaseTool:
+
+        replicas = {worker: tool for worker in workers for tool in server_name_to_tools[worker] if tool.name == name}
+        tool = next(iter(replicas.values()))
+
+        async def call_tool(**arguments):
+            worker = min(replicas, key=lambda worker: (running[worker], dispatched[worker]))
+            running[worker] += 1
+            dispatched[worker] += 1
+            try:
+                return await replicas[worker].coroutine(**arguments)
+            finally:
+                running[worker] -= 1
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=call_tool,
+            response_format=tool.response_format,
+            metadata=tool.metadata,
+        )
+
+    return [pooled(tool.name) for tool in server_name_to_tools[workers[0]]]
+
+
+@asynccontextmanager
+async def open_mcp_tools(workers: int = MCP_WORKERS, base_port: int = MCP_BASE_PORT, server_script: str = "./mcp_server.py"):
+    """Async context manager with MCP tools, starts and stops the server workers"""
+
+    processes = []
+    if workers > 1:
+        processes = await asyncio.to_thread(start_workers, workers, base_port, server_script)
+
+    try:
+        client = MultiServerMCPClient(client_config(workers, base_port, server_script))
+
+        # One persistent session per server for all tool calls (not a new session per call)
+        async with AsyncExitStack() as stack:
+            server_name_to_tools = {}
+            for server_name in client.connections:
+                session = await stack.enter_async_context(client.session(server_name))
+                server_name_to_tools[server_name] = await load_mcp_tools(session)
+
+            if workers > 1:
+                yield pool_tools(server_name_to_tools)
+            else:
+                yield next(iter(server_name_to_tools.values()))
+    finally:
+        if processes:
+            stop_workers(processes)
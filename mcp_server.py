@@ -1,12 +1,18 @@
 from dotenv import load_dotenv
 import os
+import sys
+import json
+import asyncio
+import argparse
 
 # YouTube transcription tool
-# from langchain.document_loaders import YoutubeLoader
-from langchain_community.document_loaders import YoutubeLoader
+import youtube_transcripts
 
 # Python tool
-from langchain_experimental.utilities import PythonREPL
+from repl_pool import ReplPool
+
+# Table tool
+import tables
 
 # Search tools
 # from langchain_community.tools import Tool, DuckDuckGoSearchRun
@@ -14,56 +20,110 @@ from langchain_experimental.utilities import PythonREPL
 # from langchain_community.tools.tavily_search import TavilySearchResults
 from tavily import TavilyClient
 
-from langchain_community.retrievers import WikipediaRetriever
 from langchain_community.retrievers import ArxivRetriever
+from wiki import WikiSearch
 
-# TTS tool
-import assemblyai as aai
+# Audio transcription tool
+from transcription import AudioTranscriber, format_segments
 
 # MCP server
 from mcp.server.fastmcp import FastMCP
 from mcp.server.fastmcp.prompts import base
 
+from cache import ToolResultCache
+
+
+load_dotenv()
 
 # Create an MCP server
 mcp = FastMCP("HF_Agents_Tools")
 
-### Audio tool
-@mcp.tool()
-def transcribe_audio(audio_file: str) -> str | None:
-    """Transcribes audio file into text"""
+# Cache of search results, shared across tasks and reruns
+tool_cache = ToolResultCache(
+    path=os.environ.get("TOOL_CACHE_PATH", os.path.join("tmp", "tool_cache.sqlite")),
+    ttls={
+        "websearch": float(os.environ.get("TOOL_CACHE_TTL_WEBSEARCH", 24 * 3600)),
+        "wiki_search": float(os.environ.get("TOOL_CACHE_TTL_WIKI", 7 * 24 * 3600)),
+        "arxiv_search": float(os.environ.get("TOOL_CACHE_TTL_ARXIV", 7 * 24 * 3600)),
+    },
+)
 
-    load_dotenv()
+# Pre-started Python workers for python_repl tool
+repl_pool = ReplPool(
+    size=int(os.environ.get("PYTHON_REPL_WORKERS", "2")),
+    timeout=float(os.environ.get("PYTHON_REPL_TIMEOUT", "30")),
+    cpu_seconds=int(os.environ.get("PYTHON_REPL_CPU_SECONDS", "30")),
+    memory_mb=int(os.environ.get("PYTHON_REPL_MEMORY_MB", "4096")),
+)
+
+# Wikipedia pages split into passages, parsed pages cached
+wikipedia_search = WikiSearch()
 
-    aai.settings.api_key = os.environ["ASSEMBLY_AI_API_KEY"]
+# Transcripts of audio files cached by content (backend by TRANSCRIPTION_BACKEND)
+transcriber = AudioTranscriber()
 
-    config = aai.TranscriptionConfig(speech_model=aai.SpeechModel.best)
+@mcp.resource("cache://stats")
+def cache_stats() -> str:
+    """Hit/miss statistics of tool result and transcript caches"""
 
-    transcript = aai.Transcriber(config=config).transcribe(audio_file)
+    return json.dumps({**tool_cache.stats(), "transcripts": transcriber.stats()})
 
-    if transcript.status == "error":
-        print(f"Transcription failed: {transcript.error}")
+
+### Audio tool
+@mcp.tool()
+async def transcribe_audio(audio_file: str, with_timestamps: bool = False) -> str:
+    """
+    Transcribes audio file into text.
+    - with_timestamps: prefix every sentence with its [mm:ss] start time
+    """
+
+    try:
+        transcript = await transcriber.transcribe(audio_file)
+    except Exception as e:
+        print(f"Transcription failed: {e!r}", file=sys.stderr) # stdout is MCP stdio channel
         return ""
 
-    return transcript.text
+    if with_timestamps:
+        return format_segments(transcript["segments"])
+
+    return transcript["text"]
 
 ### YouTube transcription tool
 @mcp.tool()
-def transcribe_video(video_url: str) -> str:
-    """Transcribes YouTube video into text"""
+async def transcribe_video(video_url: str) -> str:
+    """
+    Transcribes YouTube video into text.
+    Long transcripts are returned as overview, use search_video_transcript for details.
+    """
+
+    try:
+        segments = await youtube_transcripts.aload_segments(video_url)
+    except Exception as e:
+        return repr(e)
+
+    return youtube_transcripts.transcript_overview(segments)
 
-    text = ""
+@mcp.tool()
+async def search_video_transcript(video_url: str, keyword: str = "", start_time: str = "", end_time: str = "") -> str:
+    """
+    Returns parts of YouTube video transcript with [mm:ss] timestamps.
+    - keyword: return only parts mentioning the keyword (case insensitive)
+    - start_time, end_time: time range as mm:ss, hh:mm:ss or seconds, e.g. 01:30
+    """
 
-    loader = YoutubeLoader.from_youtube_url("https://www.youtube.com/watch?v=1htKBjuUWec", add_video_info=False)
-    docs = loader.load()
-    if len(docs) > 0:
-        text = docs[0].page_content
+    try:
+        segments = await youtube_transcripts.aload_segments(video_url)
+        start = youtube_transcripts.parse_time(start_time)
+        end = youtube_transcripts.parse_time(end_time)
+    except Exception as e:
+        return repr(e)
 
-    return text
+    return youtube_transcripts.search_segments(segments, keyword, start, end)
 
 ### Web search tool
 @mcp.tool()
-def websearch(websearch_query:str) -> str:
+@tool_cache.cached("websearch")
+async def websearch(websearch_query:str) -> str:
     """
     A search engine optimized for comprehensive, accurate, and trusted results.
     Useful for when you need to answer questions about current events.
@@ -73,44 +133,77 @@ def websearch(websearch_query:str) -> str:
     load_dotenv()
 
     client = TavilyClient()
-    result = client.search(query=websearch_query, search_depth="basic", max_results=3)
+    # Run in thread, so the request does not block other tools
+    result = await asyncio.to_thread(client.search, query=websearch_query, search_depth="basic", max_results=3)
     return str(result)
 
 ### Wikipedia search tool
 @mcp.tool()
-def wiki_search(wiki_search_query:str) -> str:
+@tool_cache.cached("wiki_search", source=lambda: wikipedia_search.source_id)
+async def wiki_search(wiki_search_query:str) -> str:
     """
     Searches Wikipedia for topic.
+    Returns most relevant passages (sections and tables) of found pages, each with [Page title#Section] anchor.
     """
 
-    retriever = WikipediaRetriever()
-    docs = retriever.invoke(wiki_search_query)
-    return str(docs)
+    return await asyncio.to_thread(wikipedia_search.search, wiki_search_query)
 
 ### Arxiv search tool
 @mcp.tool()
-def arxiv_search(arxiv_search_query:str) -> str:
+@tool_cache.cached("arxiv_search")
+async def arxiv_search(arxiv_search_query:str) -> str:
     """
     Searches for studies in Arxiv on topic.
     """
 
     retriever = ArxivRetriever()
-    docs = retriever.invoke(arxiv_search_query)
+    docs = await asyncio.to_thread(retriever.invoke, arxiv_search_query)
     return str(docs)
 
 ### Python tool
 @mcp.tool()
-def python_repl(python_code: str) -> str:
+async def python_repl(python_code: str) -> str:
     """
     "A Python shell. Use this to execute python commands.
     Input should be a valid python command.
     If you want to see the output of a value, you should print it out with `print(...)`."
     """
 
-    python_repl = PythonREPL()
-    result = python_repl.run(python_code, timeout=30)
+    # Run in thread, so waiting for the worker does not block other tools
+    result = await asyncio.to_thread(repl_pool.run, python_code)
 
     return result
 
+### Table query tool
+@mcp.tool()
+async def query_table(file_name: str, filter_expression: str = "", columns: list[str] | None = None,
+                      group_by: list[str] | None = None, aggregation: str = "", limit: int = 50) -> str:
+    """
+    Queries table from attached spreadsheet or CSV file.
+    - filter_expression: pandas query expression to filter rows, e.g. `Category == "Food" and Sales > 100`
+    - columns: columns to return or aggregate
+    - group_by: columns to group rows by
+    - aggregation: aggregation function, e.g. sum, mean, count, min, max, median
+    - limit: maximal number of returned rows
+    """
+
+    try:
+        return await asyncio.to_thread(tables.query_table, file_name, filter_expression, columns, group_by, aggregation, limit)
+    except Exception as e:
+        return repr(e)
+
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    # stdio for single server started by the client, streamable-http for worker of server pool (see mcp_pool.py)
+    parser = argparse.ArgumentParser(description="MCP server with agent tools")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+
+    try:
+        mcp.run(transport=args.transport)
+    finally:
+        repl_pool.close()
\ No newline at end of file
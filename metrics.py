@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+### Metrics
+# - Collected from LangChain callbacks of the graph run, no remote service needed
+# - Node durations, LLM tokens (with prompt tokens read from provider prompt cache) and calls per model tier, tool latencies and errors, graph steps per task
+# - Exported in Prometheus text format and as JSONL events
+# - When disabled, no callback is attached to the graph at all
+
+METRICS_DIR = os.path.join("tmp", "metrics")
+
+# Histogram buckets in seconds
+BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsCollector(BaseCallbackHandler):
+    """Callback handler collecting metrics of graph runs"""
+
+    run_inline = True
+
+    def __init__(self):
+
+        self.node_durations: dict[str, Histogram] = defaultdict(Histogram)
+        self.node_errors: dict[str, int] = defaultdict(int)
+        self.tool_durations: dict[str, Histogram] = defaultdict(Histogram)
+        self.tool_errors: dict[str, int] = defaultdict(int)
+        self.prompt_tokens: dict[str, int] = defaultdict(int)
+        self.cached_prompt_tokens: dict[str, int] = defaultdict(int)
+        self.completion_tokens: dict[str, int] = defaultdict(int)
+        self.llm_calls: dict[str, int] = defaultdict(int)
+        self.llm_tier_calls: dict[str, int] = defaultdict(int)
+        self.task_steps: dict[str, int] = defaultdict(int)
+
+        self.events: list[dict] = []
+
+        self._lock = threading.Lock()
+        self._runs: dict[Any, tuple] = {}
+
+    def _event(self, kind: str, task_id: str, **data) -> None:
+        self.events.append({"time": time.time(), "kind": kind, "task_id": task_id, **data})
+
+    ### Nodes
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        # Only runs of the nodes themselves, not of runnables inside them
+        if node and kwargs.get("name") == node:
+            task_id = metadata.get("task_id", "")
+            with self._lock:
+                self._runs[run_id] = (node, task_id, time.perf_counter())
+                self.task_steps[task_id] += 1
+
+    def _end_node(self, run_id, error: BaseException | None = None):
+        with self._lock:
+            if run_id not in self._runs:
+                return
+            node, task_id, start = self._runs.pop(run_id)
+            duration = time.perf_counter() - start
+            self.node_durations[node].observe(duration)
+            if error is not None:
+                self.node_errors[node] += 1
+            self._event("node", task_id, node=node, duration_s=duration, error=repr(error) if error else None)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_node(run_id, error)
+
+    ### LLM calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        with self._lock:
+            self._runs[run_id] = (
+                metadata.get("langgraph_node", "unknown"), metadata.get("task_id", ""), time.perf_counter(),
+                metadata.get("model_tier", "unknown"),
+            )
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+
+        prompt_tokens = 0
+        cached_prompt_tokens = 0
+        completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                cached_prompt_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+
+        with self._lock:
+            if run_id not in self._runs:
+                return
+            node, task_id, start, tier = self._runs.pop(run_id)
+            self.llm_calls[node] += 1
+            self.llm_tier_calls[tier] += 1
+            self.prompt_tokens[node] += prompt_tokens
+            self.cached_prompt_tokens[node] += cached_prompt_tokens
+            self.completion_tokens[node] += completion_tokens
+            self._event("llm", task_id, node=node, tier=tier, duration_s=time.perf_counter() - start,
+                        prompt_tokens=prompt_tokens, cached_prompt_tokens=cached_prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    ### Tools
+
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        with self._lock:
+            self._runs[run_id] = (serialized.get("name", "unknown"), metadata.get("task_id", ""), time.perf_counter())
+
+    def _end_tool(self, run_id, failed: bool):
+        with self._lock:
+            if run_id not in self._runs:
+                return
+            tool_name, task_id, start = self._runs.pop(run_id)
+            duration = time.perf_counter() - start
+            self.tool_durations[tool_name].observe(duration)
+            if failed:
+                self.tool_errors[tool_name] += 1
+            self._event("tool", task_id, tool=tool_name, duration_s=duration, error=failed)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        # Handled tool errors are returned as messages with error status
+        self._end_tool(run_id, getattr(output, "status", None) == "error")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, True)
+
+    ### Export
+
+    def to_prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format"""
+
+        lines = []
+
+        def histogram(name: str, help_text: str, label: str, values: dict[str, Histogram]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(values.items()):
+                for bound, count in zip(BUCKETS, hist.counts):
+                    lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {hist.sum}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {hist.count}')
+
+        def counter(name: str, help_text: str, label: str, values: dict[str, int]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(values.items()):
+                lines.append(f'{name}_total{{{label}="{key}"}} {value}')
+
+        with self._lock:
+            histogram("agent_node_duration_seconds", "Duration of graph node runs.", "node", self.node_durations)
+            counter("agent_node_errors", "Failed graph node runs.", "node", self.node_errors)
+            counter("agent_llm_calls", "LLM calls.", "node", self.llm_calls)
+            counter("agent_llm_tier_calls", "LLM calls by model tier.", "tier", self.llm_tier_calls)
+            counter("agent_llm_prompt_tokens", "LLM prompt tokens.", "node", self.prompt_tokens)
+            counter("agent_llm_cached_prompt_tokens", "LLM prompt tokens read from provider prompt cache.", "node", self.cached_prompt_tokens)
+            counter("agent_llm_completion_tokens", "LLM completion tokens.", "node", self.completion_tokens)
+            histogram("agent_tool_duration_seconds", "Duration of tool calls.", "tool", self.tool_durations)
+            counter("agent_tool_errors", "Failed tool calls.", "tool", self.tool_errors)
+            counter("agent_task_graph_steps", "Graph steps per task.", "task_id", self.task_steps)
+
+        return "\n".join(lines) + "\n# EOF\n"
+
+    def export(self, directory: str = METRICS_DIR) -> None:
+        """Writes metrics.prom and appends collected events to metrics.jsonl"""
+
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "metrics.prom"), "w") as f:
+            f.write(self.to_prometheus())
+
+        with self._lock:
+            events, self.events = self.events, []
+
+        with open(os.path.join(directory, "metrics.jsonl"), "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+
+
+def create_metrics_collector() -> MetricsCollector | None:
+    """Returns metrics collector if enabled by environment variable METRICS, otherwise None"""
+
+    if os.environ.get("METRICS", "false").lower() not in ("1", "true", "yes"):
+        return None
+
+    return MetricsCollector()
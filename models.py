@@ -0,0 +1,178 @@
+import os
+import threading
+from dotenv import load_dotenv
+from typing import Any, Callable
+
+import httpx
+from pydantic import ValidationError
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_openai import AzureChatOpenAI, ChatOpenAI
+
+
+load_dotenv()
+
+
+### Model registry
+# - Chat model clients are created lazily on first use and shared by all nodes
+# - One tuned HTTP connection pool per endpoint
+# - Structured output and tool bound runnables are created only once per schema / tool set
+# - Two tiers of models - nodes routed to "fast" tier try the fast model first and escalate to the large one
+#   when the response can't be parsed or is not confident, or when the task got escalated (validator rejection, tool error)
+
+# Provider and model (deployment) used by each node - large tier
+NODE_MODELS = {
+    "planner": ("azure", "gpt-4.1"), # "o3-mini"
+    "assistant": ("azure", "gpt-4.1"),
+    "validator": ("azure", "gpt-4.1"),
+    "replanner": ("openai", "gpt-4.1"), # Due to Azure content filters
+}
+
+# Fast tier
+FAST_NODE_MODELS = {
+    "planner": ("azure", "gpt-4.1-mini"),
+    "assistant": ("azure", "gpt-4.1-mini"),
+    "validator": ("azure", "gpt-4.1-mini"),
+    "replanner": ("openai", "gpt-4.1-mini"),
+}
+
+TIERS = {"fast": FAST_NODE_MODELS, "large": NODE_MODELS}
+
+# Routing of each node, MODEL_ROUTING_<NODE>=fast|large
+# - fast - fast tier first, escalation to large tier
+# - large - large tier only
+DEFAULT_ROUTING = {
+    "planner": "large",
+    "assistant": "fast",
+    "validator": "fast",
+    "replanner": "large",
+}
+NODE_ROUTING = {node: os.environ.get(f"MODEL_ROUTING_{node.upper()}", routing) for node, routing in DEFAULT_ROUTING.items()}
+
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+HTTP_TIMEOUT = httpx.Timeout(120, connect=10)
+
+_lock = threading.RLock()
+_http_clients: dict[str, tuple[httpx.Client, httpx.AsyncClient]] = {}
+_models: dict[tuple[str, str], BaseChatModel] = {}
+_runnables: dict[tuple, Runnable] = {}
+
+
+def _get_http_clients(endpoint: str) -> tuple[httpx.Client, httpx.AsyncClient]:
+    """Returns HTTP clients (connection pools) shared by all models of the endpoint"""
+
+    with _lock:
+        if endpoint not in _http_clients:
+            _http_clients[endpoint] = (
+                httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+                httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+            )
+        return _http_clients[endpoint]
+
+
+def _create_model(provider: str, model: str) -> BaseChatModel:
+
+    if provider == "azure":
+        endpoint = os.environ["AZURE_OPENAI_ENDPOINT"]
+        http_client, http_async_client = _get_http_clients(endpoint)
+        return AzureChatOpenAI(
+            azure_endpoint=endpoint,
+            azure_deployment=model,
+            openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+
+    if provider == "openai":
+        http_client, http_async_client = _get_http_clients(os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"))
+        return ChatOpenAI(
+            model=model,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+
+    raise ValueError(f"Unknown model provider: {provider}")
+
+
+# Can be replaced, e.g. by fake models in benchmark
+_model_factory: Callable[[str, str], BaseChatModel] = _create_model
+
+
+def set_model_factory(factory: Callable[[str, str], BaseChatModel] | None) -> None:
+    """Replaces function creating models from provider and model name (None restores default)"""
+
+    global _model_factory
+
+    with _lock:
+        _model_factory = factory or _create_model
+        _models.clear()
+        _runnables.clear()
+
+
+def model_tier(node: str, escalated: bool = False) -> str:
+    """Tier of model the node starts with"""
+
+    if NODE_ROUTING[node] == "fast" and not escalated:
+        return "fast"
+    return "large"
+
+
+def get_model(node: str, tier: str = "large") -> BaseChatModel:
+    """Returns chat model used by the node"""
+
+    key = TIERS[tier][node]
+
+    with _lock:
+        if key not in _models:
+            _models[key] = _model_factory(*key)
+        return _models[key]
+
+
+def get_structured_model(node: str, schema: type, tier: str = "large") -> Runnable:
+    """Returns model of the node with structured output"""
+
+    key = ("structured", TIERS[tier][node], schema)
+
+    with _lock:
+        if key not in _runnables:
+            # Tier is in metadata of the run for metrics
+            _runnables[key] = get_model(node, tier).with_structured_output(schema).with_config(metadata={"model_tier": tier})
+        return _runnables[key]
+
+
+def get_tool_model(node: str, tools: list, tier: str = "large", **kwargs) -> Runnable:
+    """Returns model of the node with bound tools"""
+
+    key = ("tools", TIERS[tier][node], tuple(tool.name for tool in tools), tuple(sorted(kwargs.items())))
+
+    with _lock:
+        if key not in _runnables:
+            _runnables[key] = get_model(node, tier).bind_tools(tools, **kwargs).with_config(metadata={"model_tier": tier})
+        return _runnables[key]
+
+
+def invoke_tiered(
+    node: str,
+    get_runnable: Callable[[str], Runnable],
+    messages: list,
+    escalated: bool = False,
+    confident: Callable[[Any], bool] = lambda response: response is not None,
+) -> tuple[Any, bool]:
+    """
+    Invokes runnable of the node tier by tier, starting with the fast tier if the node is routed to it.
+    Returns response and flag if the fast tier failed and the task should be escalated.
+    """
+
+    if model_tier(node, escalated) == "fast":
+        try:
+            response = get_runnable("fast").invoke(messages)
+            if confident(response):
+                return response, False
+            print(f"Escalating {node} to large model: fast model response is not confident")
+        except (OutputParserException, ValidationError) as e:
+            print(f"Escalating {node} to large model: {e!r}")
+
+        return get_runnable("large").invoke(messages), True
+
+    return get_runnable("large").invoke(messages), False
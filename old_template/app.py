@@ -1,28 +1,105 @@
 import os
+import sys
+import uuid
+import asyncio
+import time
 import gradio as gr
-import requests
-import inspect
 import pandas as pd
 
-# (Keep Constants as is)
+# The agent lives in the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from main_mcp import build_graph, build_task_input, build_task_config, MAX_CONCURRENT_TASKS, AGENT_CODE
+from streaming import stream_task, format_event, describe_event
+from utils import aiter_questions
+from submission import SubmissionQueue
+from mcp_pool import open_mcp_tools
+
 # --- Constants ---
-DEFAULT_API_URL = "https://agents-course-unit4-scoring.hf.space"
-
-# --- Basic Agent Definition ---
-# ----- THIS IS WERE YOU CAN BUILD WHAT YOU WANT ------
-class BasicAgent:
-    def __init__(self):
-        print("BasicAgent initialized.")
-    def __call__(self, question: str) -> str:
-        print(f"Agent received question (first 50 chars): {question[:50]}...")
-        fixed_answer = "This is a default answer."
-        print(f"Agent returning fixed answer: {fixed_answer}")
-        return fixed_answer
-
-def run_and_submit_all( profile: gr.OAuthProfile | None):
+# Maximal number of requests waiting in Gradio queue
+APP_QUEUE_SIZE = int(os.environ.get("APP_QUEUE_SIZE", "20"))
+# Number of runs (batch runs or single questions) of each button processed at the same time
+APP_CONCURRENT_RUNS = int(os.environ.get("APP_CONCURRENT_RUNS", "4"))
+# Interval of progress table refresh in seconds
+TABLE_REFRESH_SECONDS = 1.0
+
+# Questions running at the same time across all runs of all users
+task_slots = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+
+# --- LangGraph Agent ---
+# MCP server (or pool of server workers, MCP_WORKERS) is started with the first question and kept running by a background task
+_agent: asyncio.Future | None = None
+# Reference to the background task, otherwise it could be garbage collected with the open session
+_agent_task: asyncio.Task | None = None
+
+async def _serve_agent(agent: asyncio.Future):
+    """Keeps MCP session open for the lifetime of the app"""
+    try:
+        async with open_mcp_tools() as tools:
+            agent.set_result((build_graph(tools), tools))
+            await asyncio.Event().wait()
+    except Exception as e:
+        if not agent.done():
+            agent.set_exception(e)
+        raise
+
+async def get_agent():
+    """Returns compiled graph and MCP tools, starts MCP server on first use"""
+    global _agent, _agent_task
+    if _agent is None:
+        _agent = asyncio.get_running_loop().create_future()
+        _agent_task = asyncio.create_task(_serve_agent(_agent))
+    try:
+        return await asyncio.shield(_agent)
+    except Exception:
+        _agent = None # Try again with next question
+        raise
+
+def stop_agent(timeout: float = 30):
+    """Cancels the background task on app shutdown, closes MCP session and stops MCP server"""
+    task = _agent_task
+    if task is None or task.done():
+        return
+
+    async def cancel():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run_coroutine_threadsafe(cancel(), task.get_loop()).result(timeout)
+    except (RuntimeError, TimeoutError) as e:
+        print(f"MCP session was not closed: {e!r}")
+
+async def stream_question(question: str):
+    """Answers single question, yields progress log and answer as they come"""
+    if not question.strip():
+        yield "Please enter a question.", ""
+        return
+
+    compiled_graph, tools = await get_agent()
+    task_id = f"ui-{uuid.uuid4().hex[:8]}"
+    config = build_task_config(task_id, tools)
+
+    log = []
+    answer = ""
+    yield "Waiting for free worker...", answer
+    async with task_slots:
+        try:
+            async for event in stream_task(compiled_graph, build_task_input(question, task_id, None), config):
+                log.append(format_event(event))
+                if event["kind"] == "answer":
+                    answer = event["answer"]
+                yield "\n".join(log), answer
+        except Exception as e:
+            log.append(f"Error: {e!r}")
+            yield "\n".join(log), answer
+
+async def run_and_submit_all(profile: gr.OAuthProfile | None):
     """
-    Fetches all questions, runs the BasicAgent on them, submits all answers,
-    and displays the results.
+    Fetches all questions, runs the agent on them concurrently, submits all answers.
+    Yields status and progress table while the questions are processed.
     """
     # --- Determine HF Space Runtime URL and Repo URL ---
     space_id = os.getenv("SPACE_ID") # Get the SPACE_ID for sending link to the code
@@ -32,144 +109,153 @@ def run_and_submit_all( profile: gr.OAuthProfile | None):
         print(f"User logged in: {username}")
     else:
         print("User not logged in.")
-        return "Please Login to Hugging Face with the button.", None
-
-    api_url = DEFAULT_API_URL
-    questions_url = f"{api_url}/questions"
-    submit_url = f"{api_url}/submit"
+        yield "Please Login to Hugging Face with the button.", None
+        return
 
-    # 1. Instantiate Agent ( modify this part to create your agent)
-    try:
-        agent = BasicAgent()
-    except Exception as e:
-        print(f"Error instantiating agent: {e}")
-        return f"Error initializing agent: {e}", None
     # In the case of an app running as a hugging Face space, this link points toward your codebase ( usefull for others so please keep it public)
-    agent_code = f"https://huggingface.co/spaces/{space_id}/tree/main"
-    print(agent_code)
+    agent_code = f"https://huggingface.co/spaces/{space_id}/tree/main" if space_id else AGENT_CODE
 
-    # 2. Fetch Questions
-    print(f"Fetching questions from: {questions_url}")
+    # 1. Start the agent
+    yield "Starting agent...", None
     try:
-        response = requests.get(questions_url, timeout=15)
-        response.raise_for_status()
-        questions_data = response.json()
-        if not questions_data:
-             print("Fetched questions list is empty.")
-             return "Fetched questions list is empty or invalid format.", None
-        print(f"Fetched {len(questions_data)} questions.")
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching questions: {e}")
-        return f"Error fetching questions: {e}", None
-    except requests.exceptions.JSONDecodeError as e:
-         print(f"Error decoding JSON response from questions endpoint: {e}")
-         print(f"Response text: {response.text[:500]}")
-         return f"Error decoding server response for questions: {e}", None
+        compiled_graph, tools = await get_agent()
     except Exception as e:
-        print(f"An unexpected error occurred fetching questions: {e}")
-        return f"An unexpected error occurred fetching questions: {e}", None
-
-    # 3. Run your Agent
-    results_log = []
-    answers_payload = []
-    print(f"Running agent on {len(questions_data)} questions...")
-    for item in questions_data:
-        task_id = item.get("task_id")
-        question_text = item.get("question")
-        if not task_id or question_text is None:
-            print(f"Skipping item with missing task_id or question: {item}")
-            continue
-        try:
-            submitted_answer = agent(question_text)
-            answers_payload.append({"task_id": task_id, "submitted_answer": submitted_answer})
-            results_log.append({"Task ID": task_id, "Question": question_text, "Submitted Answer": submitted_answer})
-        except Exception as e:
-             print(f"Error running agent on task {task_id}: {e}")
-             results_log.append({"Task ID": task_id, "Question": question_text, "Submitted Answer": f"AGENT ERROR: {e}"})
+        print(f"Error starting agent: {e}")
+        yield f"Error initializing agent: {e}", None
+        return
 
-    if not answers_payload:
-        print("Agent did not produce any answers to submit.")
-        return "Agent did not produce any answers to submit.", pd.DataFrame(results_log)
+    # 2. Run questions as they arrive (attachments are downloaded in the background)
+    # Answers are submitted in background while the run continues
+    submissions = SubmissionQueue(username.strip(), agent_code)
+    await submissions.start()
+
+    rows: dict[str, dict] = {}
+    version = 0 # Increased on every change of the rows
+
+    async def run_one(question: str, task_id: str, file_name: str | None):
+        nonlocal version
+        row = rows[task_id] = {"Task ID": task_id, "Question": question, "Status": "queued", "Progress": "", "Submitted Answer": "", "Time (s)": None}
+        version += 1
+
+        async with task_slots:
+            row["Status"] = "running"
+            version += 1
+            start = time.perf_counter()
+            try:
+                graph_input = await asyncio.to_thread(build_task_input, question, task_id, file_name)
+                async for event in stream_task(compiled_graph, graph_input, build_task_config(task_id, tools)):
+                    row["Progress"] = describe_event(event).replace("\n", " ")
+                    if event["kind"] == "answer":
+                        row["Submitted Answer"] = event["answer"]
+                    row["Time (s)"] = round(time.perf_counter() - start, 1)
+                    version += 1
+                row["Status"] = "done" if row["Submitted Answer"] else "no answer"
+                if row["Submitted Answer"]:
+                    submissions.put(task_id, row["Submitted Answer"])
+            except TimeoutError as e:
+                row["Status"] = "timeout"
+                row["Progress"] = str(e)
+            except Exception as e:
+                print(f"Error running agent on task {task_id}: {e}")
+                row["Status"] = "error"
+                row["Progress"] = f"AGENT ERROR: {e}"
+            row["Time (s)"] = round(time.perf_counter() - start, 1)
+            version += 1
+
+    running: list[asyncio.Task] = []
+
+    async def feed():
+        async for question, task_id, file_name in aiter_questions(random=False):
+            running.append(asyncio.create_task(run_one(question, task_id, file_name)))
 
-    # 4. Prepare Submission 
-    submission_data = {"username": username.strip(), "agent_code": agent_code, "answers": answers_payload}
-    status_update = f"Agent finished. Submitting {len(answers_payload)} answers for user '{username}'..."
-    print(status_update)
+    def progress() -> tuple[str, pd.DataFrame]:
+        finished = sum(row["Status"] not in ("queued", "running") for row in rows.values())
+        status = f"Processed {finished}/{len(rows)} questions..."
+        return status, pd.DataFrame(list(rows.values()))
 
-    # 5. Submit
-    print(f"Submitting {len(answers_payload)} answers to: {submit_url}")
+    feeder = asyncio.create_task(feed())
     try:
-        response = requests.post(submit_url, json=submission_data, timeout=60)
-        response.raise_for_status()
-        result_data = response.json()
-        final_status = (
-            f"Submission Successful!\n"
-            f"User: {result_data.get('username')}\n"
-            f"Overall Score: {result_data.get('score', 'N/A')}% "
-            f"({result_data.get('correct_count', '?')}/{result_data.get('total_attempted', '?')} correct)\n"
-            f"Message: {result_data.get('message', 'No message received.')}"
-        )
-        print("Submission successful.")
-        results_df = pd.DataFrame(results_log)
-        return final_status, results_df
-    except requests.exceptions.HTTPError as e:
-        error_detail = f"Server responded with status {e.response.status_code}."
-        try:
-            error_json = e.response.json()
-            error_detail += f" Detail: {error_json.get('detail', e.response.text)}"
-        except requests.exceptions.JSONDecodeError:
-            error_detail += f" Response: {e.response.text[:500]}"
-        status_message = f"Submission Failed: {error_detail}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except requests.exceptions.Timeout:
-        status_message = "Submission Failed: The request timed out."
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except requests.exceptions.RequestException as e:
-        status_message = f"Submission Failed: Network error - {e}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except Exception as e:
-        status_message = f"An unexpected error occurred during submission: {e}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
+        shown_version = -1
+        while True:
+            await asyncio.sleep(TABLE_REFRESH_SECONDS)
+            all_done = feeder.done() and all(task.done() for task in running)
+            if version != shown_version:
+                shown_version = version
+                status, table = progress()
+                yield f"{status}\n{submissions.status}", table
+            if all_done:
+                break
+    finally:
+        # Stop all questions of this run when the run is cancelled, answers already produced are submitted
+        feeder.cancel()
+        for task in running:
+            task.cancel()
+        await submissions.close()
+
+    if feeder.exception():
+        print(f"Error fetching questions: {feeder.exception()}")
+        yield f"Error fetching questions: {feeder.exception()}", progress()[1]
+        return
+
+    if not any(row["Submitted Answer"] for row in rows.values()):
+        print("Agent did not produce any answers to submit.")
+        yield "Agent did not produce any answers to submit.", progress()[1]
+        return
+
+    # 3. Remaining answers were submitted when the submission queue was closed
+    print(f"Submission result: {submissions.status}")
+    yield f"Agent finished for user '{username}'.\n{submissions.status}", progress()[1]
 
 
 # --- Build Gradio Interface using Blocks ---
 with gr.Blocks() as demo:
-    gr.Markdown("# Basic Agent Evaluation Runner")
+    gr.Markdown("# LangGraph Agent Evaluation Runner")
     gr.Markdown(
         """
         **Instructions:**
 
-        1.  Please clone this space, then modify the code to define your agent's logic, the tools, the necessary packages, etc ...
-        2.  Log in to your Hugging Face account using the button below. This uses your HF username for submission.
-        3.  Click 'Run Evaluation & Submit All Answers' to fetch questions, run your agent, submit answers, and see the score.
+        1.  Log in to your Hugging Face account using the button below. This uses your HF username for submission.
+        2.  Click 'Run Evaluation & Submit All Answers' to fetch questions, run the agent, submit answers, and see the score.
+        3.  Or ask a single question below and watch the agent working on it.
 
         ---
-        **Disclaimers:**
-        Once clicking on the "submit button, it can take quite some time ( this is the time for the agent to go through all the questions).
-        This space provides a basic setup and is intentionally sub-optimal to encourage you to develop your own, more robust solution. For instance for the delay process of the submit button, a solution could be to cache the answers and submit in a seperate action or even to answer the questions in async.
+        **Notes:**
+        Questions are processed concurrently, the table shows progress of each of them while the run continues.
+        Runs of several users share a bounded pool of workers, a run can be cancelled at any time.
         """
     )
 
     gr.LoginButton()
 
-    run_button = gr.Button("Run Evaluation & Submit All Answers")
+    with gr.Row():
+        run_button = gr.Button("Run Evaluation & Submit All Answers")
+        cancel_button = gr.Button("Cancel Run")
 
     status_output = gr.Textbox(label="Run Status / Submission Result", lines=5, interactive=False)
     # Removed max_rows=10 from DataFrame constructor
     results_table = gr.DataFrame(label="Questions and Agent Answers", wrap=True)
 
-    run_button.click(
+    run_event = run_button.click(
         fn=run_and_submit_all,
         outputs=[status_output, results_table]
     )
+    cancel_button.click(fn=None, cancels=[run_event])
+
+    gr.Markdown("## Single question")
+    question_input = gr.Textbox(label="Question", lines=2)
+    with gr.Row():
+        ask_button = gr.Button("Ask")
+        stop_button = gr.Button("Stop")
+    progress_output = gr.Textbox(label="Progress", lines=12, interactive=False)
+    answer_output = gr.Textbox(label="Answer", interactive=False)
+
+    ask_event = ask_button.click(
+        fn=stream_question,
+        inputs=[question_input],
+        outputs=[progress_output, answer_output]
+    )
+    # Cancelling the event closes the stream, which stops the graph run
+    stop_button.click(fn=None, cancels=[ask_event])
 
 if __name__ == "__main__":
     print("\n" + "-"*30 + " App Starting " + "-"*30)
@@ -192,5 +278,15 @@ if __name__ == "__main__":
 
     print("-"*(60 + len(" App Starting ")) + "\n")
 
-    print("Launching Gradio Interface for Basic Agent Evaluation...")
-    demo.launch(debug=True, share=False)
\ No newline at end of file
+    print("Launching Gradio Interface for LangGraph Agent Evaluation...")
+    # Bounded queue, runs of several users are processed at the same time
+    demo.queue(default_concurrency_limit=APP_CONCURRENT_RUNS, max_size=APP_QUEUE_SIZE)
+    demo.launch(share=False, prevent_thread_lock=True)
+    try:
+        while demo.is_running:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        print("Keyboard interruption in main thread... closing server.")
+    finally:
+        stop_agent()
+        demo.close()
\ No newline at end of file
@@ -3,26 +3,21 @@ from dotenv import load_dotenv
 from typing import List
 
 from pydantic import BaseModel, Field
-from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from state import *
 from utils import *
+from models import get_structured_model, invoke_tiered
+from prompts import build_prompt
 
 
 load_dotenv()
 
-planning_model = AzureChatOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    # azure_deployment="o3-mini",
-    azure_deployment="gpt-4.1",
-    openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-)
-
 
 ### Planner
 # - Starts the task processing
 # - Creates plan
+# - Prompt starts with task prefix shared by all steps (see prompts.py)
 
 class Plan(BaseModel):
     """Plan to follow in future"""
@@ -35,29 +30,24 @@ class Plan(BaseModel):
 def planner(state: TaskState):
     """Creates step by step plan to finish defined task"""
 
-    question = state["question"]
-
     planner_prompt = (
-        "For the given objective, come up with a simple step by step plan. "
+        "For the question above, come up with a simple step by step plan. "
         "This plan should involve individual tasks, that if executed correctly will yield the correct answer. Do not add any superfluous steps. "
         "The result of the final step should be the final answer. Make sure that each step has all the information needed - do not skip steps. "
-        "You have tools for web search, audio transcription, youtube video transcription and python code execution at your disposal. "
-        "For simple tasks you MUST not generate many steps. Single step plan is also good. "
+        "For simple tasks you MUST not generate many steps. Single step plan is also good."
     )
 
-    # Add file to prompt
-    system_content = add_file_to_prompt(planner_prompt, state)
-
-    # Build messages
-    planner_messages = [
-        SystemMessage(content=system_content),
-        HumanMessage(content=question),
-    ]
+    # Task prefix (question and attachment) first, shared with later steps
+    planner_messages = build_prompt(state, planner_prompt, [])
 
-    planning_model_structured = planning_model.with_structured_output(Plan)
-
-    plan = planning_model_structured.invoke(planner_messages)
+    plan, escalate = invoke_tiered(
+        "planner",
+        lambda tier: get_structured_model("planner", Plan, tier),
+        planner_messages,
+        confident=lambda plan: plan is not None and len(plan.steps) > 0,
+    )
 
     return {
-        "plan": plan.steps
+        "plan": plan.steps,
+        "escalated": escalate
     }
\ No newline at end of file
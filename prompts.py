@@ -0,0 +1,37 @@
+from langchain_core.messages import HumanMessage
+
+from state import TaskState
+from utils import add_file_to_prompt
+
+
+### Prompt layout
+# - Every prompt of the task starts with the same task prefix - shared instructions, question and attachment
+# - Node instructions follow, changing content (plan, past steps, knowledge, feedback) is always at the end
+# - Prefix is byte-identical in all steps of the task, so provider prompt caching can reuse it (cached tokens are in metrics)
+
+TASK_INSTRUCTIONS = (
+    "You are part of an AI agent answering questions. "
+    "The agent creates step by step plan, executes the steps with tools and returns the answer formatted exactly as the question requires. "
+    "Tools for web search, Wikipedia and arXiv search, audio transcription, YouTube video transcription, "
+    "table queries and Python code execution are at disposal.\n\n"
+)
+
+
+def task_prefix(state: TaskState) -> HumanMessage:
+    """First message of every prompt of the task - instructions, question and attachment"""
+
+    prompt = f"{TASK_INSTRUCTIONS}The question:\n{state['question']}\n\n"
+
+    # Note: Human message, because it can contain images, which are not correctly interpreted in system prompt
+    return HumanMessage(content=add_file_to_prompt(prompt, state))
+
+
+def build_prompt(state: TaskState, instructions: str, sections: list[tuple[str, str]]) -> list[HumanMessage]:
+    """Task prefix, then node instructions and changing sections (heading, text), empty sections are skipped"""
+
+    content = instructions
+    for heading, text in sections:
+        if text:
+            content += f"\n\n{heading}\n{text}"
+
+    return [task_prefix(state), HumanMessage(content=content)]
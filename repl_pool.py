@@ -0,0 +1,269 @@
+import os
+import sys
+import io
+import json
+import time
+import queue
+import signal
+import select
+import threading
+import subprocess
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError: # Windows, limits are not applied
+    resource = None
+
+
+### Python REPL worker pool
+# - Workers are started in advance with pandas and numpy imported
+# - Every call gets hard wall clock timeout, worker is killed and replaced when exceeded
+# - CPU time and memory of workers is limited by rlimits
+# - Workers that could not be started are started again by the next call, pool does not shrink
+
+# Modules imported by every worker before first use
+PRELOADED_MODULES = ["math", "re", "json", "datetime", "collections", "itertools", "numpy", "pandas"]
+
+# Time for worker to import modules and report ready
+STARTUP_TIMEOUT = 60
+
+
+class WorkerError(Exception):
+    """Worker did not return result (timeout, crash or exceeded limits)"""
+
+
+class ReplWorker:
+    """Python process executing code snippets received over stdin"""
+
+    def __init__(self, cpu_seconds: int, memory_mb: int):
+
+        self.tasks_done = 0
+        self.ready = False
+        self._buffer = b""
+
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(cpu_seconds), str(memory_mb)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def _read_line(self, deadline: float) -> dict:
+        """Reads one JSON line from worker, raises WorkerError after deadline"""
+
+        stdout = self.process.stdout.fileno()
+
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerError("timeout")
+
+            readable, _, _ = select.select([stdout], [], [], remaining)
+            if not readable:
+                continue
+
+            chunk = os.read(stdout, 65536)
+            if not chunk:
+                raise WorkerError("worker exited")
+            self._buffer += chunk
+
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def run(self, code: str, timeout: float) -> str:
+
+        if not self.ready:
+            self._read_line(time.monotonic() + STARTUP_TIMEOUT)
+            self.ready = True
+
+        try:
+            self.process.stdin.write(json.dumps({"code": code}).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise WorkerError("worker exited")
+
+        response = self._read_line(time.monotonic() + timeout)
+        self.tasks_done += 1
+
+        return response["output"]
+
+    def exit_reason(self) -> str:
+        """Why the worker process ended, e.g. 'killed by signal SIGXCPU' or 'exit code 1'"""
+
+        try:
+            code = self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            return "stopped responding"
+
+        if code < 0:
+            try:
+                return f"killed by signal {signal.Signals(-code).name}"
+            except ValueError:
+                return f"killed by signal {-code}"
+        return f"exit code {code}"
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class ReplPool:
+    """Pool of pre-started Python workers"""
+
+    def __init__(self, size: int = 2, timeout: float = 30, cpu_seconds: int = 30, memory_mb: int = 4096,
+                 max_tasks_per_worker: int = 50):
+
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+
+        self.size = max(1, size)
+
+        # Workers running or starting (idle or busy)
+        self._workers = self.size
+        self._lock = threading.Lock()
+
+        self._idle: queue.Queue[ReplWorker] = queue.Queue()
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        """Starts worker, if it fails the pool is one worker smaller until the next call"""
+
+        try:
+            worker = ReplWorker(self.cpu_seconds, self.memory_mb)
+        except OSError as e:
+            with self._lock:
+                self._workers -= 1
+            print(f"Python worker could not be started: {e!r}", file=sys.stderr) # stdout is MCP stdio channel
+            return
+
+        self._idle.put(worker)
+
+    def _acquire(self) -> ReplWorker:
+        """Waits for idle worker, starts missing worker if some failed to start"""
+
+        while True:
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                missing = self._workers < self.size
+                if missing:
+                    self._workers += 1
+
+            if missing:
+                try:
+                    return ReplWorker(self.cpu_seconds, self.memory_mb)
+                except OSError as e:
+                    with self._lock:
+                        self._workers -= 1
+                    raise WorkerError(f"worker could not be started: {e!r}") from e
+
+    def _replace(self, worker: ReplWorker) -> None:
+        """Kills worker and starts new one in background"""
+
+        worker.kill()
+        threading.Thread(target=self._spawn, daemon=True).start()
+
+    def run(self, code: str) -> str:
+        """Executes code in an idle worker and returns printed output or error"""
+
+        try:
+            worker = self._acquire()
+        except WorkerError as e:
+            return repr(WorkerError(f"Python {e}"))
+
+        try:
+            output = worker.run(code, self.timeout)
+        except WorkerError as e:
+            if str(e) == "timeout":
+                self._replace(worker)
+                return f"TimeoutError('Execution exceeded {self.timeout} seconds and was stopped')"
+
+            reason = worker.exit_reason()
+            self._replace(worker)
+            if reason == "killed by signal SIGXCPU":
+                return f"WorkerError('Execution stopped, CPU time limit of {self.cpu_seconds} seconds was exceeded')"
+            return f"WorkerError('Execution stopped, Python worker {reason}')"
+
+        if worker.tasks_done >= self.max_tasks_per_worker:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+        return output
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().kill()
+
+
+### Worker process
+
+def _set_limits(cpu_seconds: int, memory_mb: int) -> None:
+    """Limits memory of the worker and CPU time of the next snippet"""
+
+    if resource is None:
+        return
+
+    if memory_mb > 0:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, memory_mb * 1024 * 1024))
+        except (ValueError, OSError):
+            pass
+
+    if cpu_seconds > 0:
+        # Limit is for the whole process lifetime, so it is moved for every snippet
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, hard))
+
+
+def _worker_main(cpu_seconds: int, memory_mb: int) -> None:
+
+    # Keep private copies of stdin and stdout for requests and responses, output of the snippets is captured
+    requests = os.fdopen(os.dup(sys.stdin.fileno()), "r")
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+    # Snippets reading input get end of file, not the requests
+    os.dup2(os.open(os.devnull, os.O_RDONLY), sys.stdin.fileno())
+
+    for module in PRELOADED_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+    _set_limits(0, memory_mb)
+
+    protocol.write(json.dumps({"ready": True}) + "\n")
+    protocol.flush()
+
+    for line in requests:
+        code = json.loads(line)["code"]
+
+        _set_limits(cpu_seconds, 0)
+
+        # Same behaviour as PythonREPL - fresh globals, printed output or error representation
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                exec(code, {"__name__": "__main__"})
+            result = output.getvalue()
+        except BaseException as e:
+            result = repr(e)
+
+        protocol.write(json.dumps({"output": result}) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    _worker_main(int(sys.argv[1]), int(sys.argv[2]))
@@ -1,7 +1,6 @@
 from typing import TypedDict, Annotated, Optional, Tuple, List
 
 import operator
-from langchain_community.tools import BaseTool
 from langchain_core.messages import AnyMessage
 from langgraph.graph.message import add_messages
 
@@ -14,7 +13,7 @@ class TaskState(TypedDict):
     file_name: Optional[str]
     file_type: Optional[str]
     file_content: Optional[bytes]
-    tools_list: Optional[List[BaseTool]]
+    file_data_url: Optional[str] # Prepared image attachment
 
     # Output data
     plan: List[str]
@@ -22,4 +21,7 @@ class TaskState(TypedDict):
     answer: str
     assistant_messages: list[AnyMessage] # Note: no automatic addition for better control
     tool_messages: list[AnyMessage] # Separated from assistant messages, because without automatic addition, tool will replace the list
-    collected_knowledge: str
\ No newline at end of file
+    collected_knowledge: list[str] # Deduplicated chunks of tool outputs
+    tool_results: dict[str, str] # Results of tool calls by fingerprint (tool name and normalized arguments)
+    stagnant_iterations: int # Number of last tool iterations without new information
+    escalated: bool # Task uses large models only (after validator rejection, tool error or failure of fast model)
\ No newline at end of file
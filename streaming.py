@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+from contextlib import suppress
+from typing import AsyncIterator
+
+
+### Streaming runs
+# - Graph run translated into structured events as they happen (astream_events v2)
+# - Events: plan, step, tool (with latency), candidate answer, replan, validation, answer
+# - The graph runs in its own asyncio task, consumer can stop it by closing the stream
+# - Optional timeout per task (TASK_TIMEOUT seconds, 0 = no limit)
+
+TASK_TIMEOUT = float(os.environ.get("TASK_TIMEOUT", "0"))
+
+# Maximal length of tool input shown in events
+TOOL_INPUT_CHARS = 200
+
+
+async def stream_task(compiled_graph, graph_input, config: dict, timeout: float = TASK_TIMEOUT) -> AsyncIterator[dict]:
+    """
+    Runs the graph and yields progress events of the task.
+    Raises errors of the graph run, TimeoutError when the task does not finish in `timeout` seconds.
+    Closing the generator (or cancelling its consumer) cancels the graph run.
+    """
+
+    task_id = config.get("metadata", {}).get("task_id", "")
+    started = time.perf_counter()
+    tool_starts: dict[str, float] = {}
+
+    def event(kind: str, **data) -> dict:
+        return {"kind": kind, "task_id": task_id, "elapsed_s": round(time.perf_counter() - started, 3), **data}
+
+    def translate(raw: dict) -> list[dict]:
+        """Converts LangChain event into progress events"""
+
+        kind = raw["event"]
+        data = raw.get("data", {})
+
+        # Whole graph finished
+        if kind == "on_chain_end" and not raw.get("parent_ids"):
+            output = data.get("output") or {}
+            return [event("answer", answer=output.get("answer", ""))]
+
+        if kind == "on_tool_start":
+            tool_starts[raw["run_id"]] = time.perf_counter()
+            return []
+
+        if kind == "on_tool_end":
+            start = tool_starts.pop(raw["run_id"], time.perf_counter())
+            tool_input = str(data.get("input", ""))
+            return [event(
+                "tool",
+                tool=raw["name"],
+                input=tool_input[:TOOL_INPUT_CHARS],
+                latency_s=round(time.perf_counter() - start, 3),
+                error=getattr(data.get("output"), "status", None) == "error",
+            )]
+
+        # Only outputs of the nodes themselves, not of runnables inside them
+        node = raw.get("metadata", {}).get("langgraph_node")
+        if kind != "on_chain_end" or not node or raw["name"] != node:
+            return []
+
+        output = data.get("output") or {}
+
+        if node == "planner":
+            return [event("plan", steps=output["plan"]), event("step", step=output["plan"][0])]
+
+        if node == "replanner":
+            if output.get("answer"):
+                return [event("candidate", answer=output["answer"])]
+            return [event("replan", steps=output["plan"]), event("step", step=output["plan"][0])]
+
+        if node == "validator":
+            feedback = output["past_steps"][-1][1] if output.get("past_steps") else ""
+            return [event("validation", accepted=bool(output.get("answer")), feedback=feedback)]
+
+        return []
+
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def produce():
+        try:
+            async for raw in compiled_graph.astream_events(graph_input, config, version="v2"):
+                queue.put_nowait(raw)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(finished)
+
+    producer = asyncio.create_task(produce())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout else None
+
+    try:
+        while True:
+            remaining = None if deadline is None else max(0, deadline - loop.time())
+            try:
+                raw = await asyncio.wait_for(queue.get(), remaining)
+            except TimeoutError:
+                raise TimeoutError(f"Task did not finish in {timeout} s") from None
+
+            if raw is finished:
+                return
+            if isinstance(raw, Exception):
+                raise raw
+
+            for progress_event in translate(raw):
+                yield progress_event
+    finally:
+        # Stops the graph run (sync node already running in a thread finishes in background)
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+
+
+def describe_event(event: dict) -> str:
+    """Description of the event without task ID and time"""
+
+    kind = event["kind"]
+
+    if kind in ("plan", "replan"):
+        steps = "".join(f"\n    {i}. {step}" for i, step in enumerate(event["steps"], 1))
+        return f"{'Plan' if kind == 'plan' else 'New plan'}:{steps}"
+    if kind == "step":
+        return f"Step: {event['step']}"
+    if kind == "tool":
+        status = " (error)" if event["error"] else ""
+        return f"Tool {event['tool']} {event['latency_s']:.2f}s{status}: {event['input']}"
+    if kind == "candidate":
+        return f"Proposed answer: {event['answer']}"
+    if kind == "validation":
+        verdict = "accepted" if event["accepted"] else f"rejected - {event['feedback']}"
+        return f"Validation {verdict}"
+    if kind == "answer":
+        return f"Final answer: {event['answer']}"
+
+    return kind
+
+
+def format_event(event: dict) -> str:
+    """One line description of the event"""
+
+    return f"[{event['task_id']}] {event['elapsed_s']:7.1f}s {describe_event(event)}"
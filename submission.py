@@ -0,0 +1,197 @@
+import os
+import json
+import random
+import asyncio
+
+import httpx
+
+from cache import DiskCache
+from utils import submit_url
+
+
+### Answer submission
+# - Answers are queued as tasks finish and submitted by a background task, agent does not wait for the scoring API
+# - Submitted in batches - after SUBMIT_BATCH_SIZE new answers or SUBMIT_FLUSH_SECONDS, and at the end of the run
+# - Scoring API scores each submission as a whole, so every submission contains all answers of the user (one per task ID)
+# - Transient failures (network errors, 429, 5xx) are retried with exponential backoff and jitter
+# - Answers are persisted in SQLite, pending ones are submitted after restart
+
+SUBMISSIONS_PATH = os.environ.get("SUBMISSIONS_PATH", os.path.join("tmp", "submissions.sqlite"))
+SUBMIT_BATCH_SIZE = int(os.environ.get("SUBMIT_BATCH_SIZE", "5"))
+SUBMIT_FLUSH_SECONDS = float(os.environ.get("SUBMIT_FLUSH_SECONDS", "30"))
+SUBMIT_MAX_RETRIES = int(os.environ.get("SUBMIT_MAX_RETRIES", "5"))
+
+# Backoff delays in seconds
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class SubmissionQueue:
+    """Answers of one user waiting for submission, submitted in background"""
+
+    def __init__(self, username: str, agent_code: str, path: str = SUBMISSIONS_PATH,
+                 batch_size: int = SUBMIT_BATCH_SIZE, flush_interval: float = SUBMIT_FLUSH_SECONDS,
+                 max_retries: int = SUBMIT_MAX_RETRIES):
+
+        self.username = username
+        self.agent_code = agent_code
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+
+        self.store = DiskCache(path, table="submissions", max_entries=1_000_000)
+        self.status = "Nothing submitted yet"
+
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock() # One submission at a time
+        self._client: httpx.AsyncClient | None = None
+        self._worker: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    ### Queue
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.username}:{task_id}"
+
+    def _entries(self) -> dict[str, dict]:
+        """Stored answers of the user by task ID"""
+
+        prefix = self._key("")
+        return {key[len(prefix):]: json.loads(value) for key, value in self.store.items() if key.startswith(prefix)}
+
+    def put(self, task_id: str, answer: str) -> None:
+        """Queues answer of the task, same answer already queued or submitted is ignored"""
+
+        value = self.store.get(self._key(task_id))
+        if value and json.loads(value)["answer"] == answer:
+            return
+
+        self.store.set(self._key(task_id), json.dumps({"answer": answer, "submitted": False}))
+        if self.pending() >= self.batch_size:
+            self._wakeup.set()
+
+    def clear(self) -> None:
+        """Removes all answers of the user, queued and submitted"""
+
+        for task_id in self._entries():
+            self.store.delete(self._key(task_id))
+
+    def pending(self) -> int:
+        """Number of answers not submitted yet"""
+
+        return sum(not entry["submitted"] for entry in self._entries().values())
+
+    ### Submission
+
+    async def start(self) -> None:
+        """Starts background submission, answers left from previous run are submitted right away"""
+
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(15, read=60))
+        self._worker = asyncio.create_task(self._run())
+        if self.pending():
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Background submission keeps running, answers stay pending
+                self.status = f"Submission Failed: {e!r}"
+                print(self.status)
+
+    async def flush(self) -> str:
+        """Submits all answers if some are pending, returns status of the last submission"""
+
+        async with self._lock:
+
+            entries = self._entries()
+            pending = {task_id: entry["answer"] for task_id, entry in entries.items() if not entry["submitted"]}
+            if not pending:
+                return self.status
+
+            submission_data = {
+                "username": self.username,
+                "agent_code": self.agent_code,
+                "answers": [{"task_id": task_id, "submitted_answer": entry["answer"]} for task_id, entry in entries.items()],
+            }
+
+            result_data = await self._post(submission_data)
+            if result_data is None:
+                return self.status
+
+            # Answers changed during submission stay pending
+            for task_id, answer in pending.items():
+                value = self.store.get(self._key(task_id))
+                if value and json.loads(value)["answer"] == answer:
+                    self.store.set(self._key(task_id), json.dumps({"answer": answer, "submitted": True}))
+
+            self.status = (
+                f"Submitted {len(entries)} answers. "
+                f"Overall Score: {result_data.get('score', 'N/A')}% "
+                f"({result_data.get('correct_count', '?')}/{result_data.get('total_attempted', '?')} correct)"
+            )
+            print(self.status)
+            return self.status
+
+    async def _post(self, submission_data: dict) -> dict | None:
+        """Posts submission with retries, returns response data or None on failure"""
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.post(submit_url, json=submission_data)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"Server responded with status {response.status_code}."
+            except httpx.HTTPStatusError as e:
+                # Client errors are not retried, answers stay pending
+                self.status = f"Submission Failed: Server responded with status {e.response.status_code}. Response: {e.response.text[:500]}"
+                print(self.status)
+                return None
+            except httpx.TransportError as e:
+                error = f"Network error - {e!r}"
+            except (httpx.HTTPError, ValueError) as e:
+                # Invalid response (decoding, redirects, JSON) - not retried, answers stay pending for next submission
+                self.status = f"Submission Failed: Invalid response - {e!r}"
+                print(self.status)
+                return None
+
+            if attempt == self.max_retries:
+                break
+
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            print(f"Submission attempt {attempt + 1} failed ({error}), retrying in {delay:.1f} s")
+            await asyncio.sleep(delay)
+
+        self.status = f"Submission Failed: {error}"
+        print(self.status)
+        return None
+
+    async def close(self) -> None:
+        """Stops background submission and submits remaining answers"""
+
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._client:
+            await self.flush()
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,98 @@
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+
+### Tables from attachments
+# - Spreadsheets and CSV files are converted once into Parquet files in tmp directory
+# - Prompt gets only compact summary, data can be queried with query_table tool
+
+TABLE_EXTENSIONS = ["xlsx", "xls", "csv"]
+
+# Tables up to this number of rows are included in the summary completely
+FULL_TABLE_ROWS = 30
+SAMPLE_ROWS = 5
+
+
+def table_path(file_name: str) -> str:
+    return os.path.join("tmp", f"{file_name}.parquet")
+
+
+def convert_table(file_name: str) -> str:
+    """Converts spreadsheet or CSV file into Parquet (if not done yet) and returns its path"""
+
+    source_path = os.path.join("tmp", file_name)
+    target_path = table_path(file_name)
+
+    if os.path.exists(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(source_path):
+        return target_path
+
+    if file_name.lower().endswith(".csv"):
+        df = pd.read_csv(source_path)
+    else:
+        df = pd.read_excel(source_path)
+
+    # Parquet requires string column names and single type per column
+    df.columns = [str(column) for column in df.columns]
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+
+    df.to_parquet(target_path, index=False)
+
+    return target_path
+
+
+@lru_cache(maxsize=16)
+def _read_table(path: str, modified: float) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def load_table(file_name: str) -> pd.DataFrame:
+    path = convert_table(file_name)
+    return _read_table(path, os.path.getmtime(path))
+
+
+def summarize_table(file_name: str) -> str:
+    """Returns schema and sample of the table for the prompt"""
+
+    df = load_table(file_name)
+    rows, columns = df.shape
+
+    summary = f"Table from file {file_name} with {rows} rows and {columns} columns.\n"
+    summary += "Columns:\n" + "\n".join(f"- {column} ({dtype})" for column, dtype in df.dtypes.items()) + "\n"
+
+    if rows <= FULL_TABLE_ROWS:
+        summary += f"All rows:\n{df.to_string()}\n"
+    else:
+        summary += (
+            f"First {SAMPLE_ROWS} rows:\n{df.head(SAMPLE_ROWS).to_string()}\n"
+            f"Use query_table tool with file name {file_name} to filter or aggregate the remaining rows.\n"
+        )
+
+    return summary
+
+
+def query_table(file_name: str, filter_expression: str = "", columns: list[str] | None = None,
+                group_by: list[str] | None = None, aggregation: str = "", limit: int = 50) -> str:
+    """Filters and aggregates table, returns result as text"""
+
+    df = load_table(file_name)
+
+    if filter_expression:
+        df = df.query(filter_expression)
+
+    if group_by:
+        grouped = df.groupby(group_by)
+        if columns:
+            grouped = grouped[columns]
+        result = grouped.agg(aggregation or "count")
+    elif aggregation:
+        result = (df[columns] if columns else df.select_dtypes("number")).agg(aggregation)
+    else:
+        result = df[columns] if columns else df
+
+    if isinstance(result, pd.DataFrame) and len(result) > limit:
+        return f"{result.head(limit).to_string()}\n... {len(result) - limit} more rows"
+
+    return result.to_string()
@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import asyncio
+from typing import Literal
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from state import TaskState
+from cache import normalize_query
+from utils import content_text
+
+
+### Tools node
+# - Executes all tool calls requested by assistant in one message concurrently
+# - Number of concurrently running tools of one task is limited
+# - Results are returned in order of the tool calls
+# - Repeated tool calls (same tool and arguments, search queries normalized) are answered with previous result
+# - After STAGNATION_LIMIT iterations without new information, the task goes to replanner
+# - Tool error escalates the rest of the task to large models (see models.py)
+
+MAX_PARALLEL_TOOL_CALLS = int(os.environ.get("MAX_PARALLEL_TOOL_CALLS", "3"))
+STAGNATION_LIMIT = int(os.environ.get("STAGNATION_LIMIT", "3"))
+
+# Tools whose queries are compared as sets of words (word order and stopwords do not matter)
+SEARCH_TOOLS = ["websearch", "wiki_search", "arxiv_search"]
+STOPWORDS = {"a", "an", "the", "of", "in", "on", "at", "for", "to", "and", "or", "is", "are", "was", "were",
+             "what", "which", "who", "when", "where", "how", "by", "with", "from", "about"}
+
+
+def tool_call_fingerprint(tool_call: dict) -> str:
+    """Identifies tool call by tool name and arguments, queries of search tools are normalized"""
+
+    def normalize(value):
+        # Only search queries, other arguments (code, video IDs, filters) are case and whitespace sensitive
+        if isinstance(value, str) and tool_call["name"] in SEARCH_TOOLS:
+            value = " ".join(sorted(set(re.findall(r"\w+", normalize_query(value))) - STOPWORDS))
+        return value
+
+    arguments = {key: normalize(value) for key, value in tool_call["args"].items()}
+    return f"{tool_call['name']}:{json.dumps(arguments, sort_keys=True, default=str)}"
+
+
+def create_tools_node(tools, max_concurrency: int = MAX_PARALLEL_TOOL_CALLS):
+    """Creates graph node executing tool calls from last assistant message"""
+
+    tools_by_name = {tool.name: tool for tool in tools}
+
+    async def run_tool_call(tool_call: dict, semaphore: asyncio.Semaphore, config: RunnableConfig) -> ToolMessage:
+
+        tool = tools_by_name.get(tool_call["name"])
+        if tool is None:
+            return ToolMessage(
+                content=f"Error: {tool_call['name']} is not a valid tool, try one of [{', '.join(tools_by_name)}].",
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+
+        async with semaphore:
+            try:
+                return await tool.ainvoke({**tool_call, "type": "tool_call"}, config)
+            except Exception as e:
+                return ToolMessage(
+                    content=f"Error: {e!r}\n Please fix your mistakes.",
+                    name=tool_call["name"],
+                    tool_call_id=tool_call["id"],
+                    status="error",
+                )
+
+    async def tools_node(state: TaskState, config: RunnableConfig):
+        """Executes tool calls of the last assistant message"""
+
+        message = state["tool_messages"][-1]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        # Results of previous tool calls of the task by fingerprint
+        tool_results = dict(state.get("tool_results") or {})
+        known_contents = set(tool_results.values())
+
+        async def execute(tool_call: dict) -> tuple[ToolMessage, bool]:
+            """Returns tool message and flag if it brought new information"""
+
+            fingerprint = tool_call_fingerprint(tool_call)
+            if fingerprint in tool_results:
+                return ToolMessage(
+                    content=f"This tool call was already made, previous result:\n{tool_results[fingerprint]}",
+                    name=tool_call["name"],
+                    tool_call_id=tool_call["id"],
+                ), False
+
+            tool_message = await run_tool_call(tool_call, semaphore, config)
+            if tool_message.status == "error":
+                return tool_message, False
+
+            content = content_text(tool_message.content)
+            tool_results[fingerprint] = content
+            return tool_message, content not in known_contents
+
+        executed = await asyncio.gather(*(execute(tool_call) for tool_call in message.tool_calls))
+
+        new_information = any(is_new for _, is_new in executed)
+        tool_error = any(tool_message.status == "error" for tool_message, _ in executed)
+
+        return {
+            "tool_messages": [tool_message for tool_message, _ in executed],
+            "tool_results": tool_results,
+            "stagnant_iterations": 0 if new_information else state.get("stagnant_iterations", 0) + 1,
+            "escalated": state.get("escalated", False) or tool_error,
+        }
+
+    return tools_node
+
+
+def stagnation_condition(state: TaskState) -> Literal["assistant", "replanner"]:
+    """Continue with assistant, or go to replanner if tools stopped bringing new information"""
+
+    if state.get("stagnant_iterations", 0) >= STAGNATION_LIMIT:
+        return "replanner"
+
+    return "assistant"
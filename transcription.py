@@ -0,0 +1,214 @@
+import os
+import json
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from typing import TypedDict
+
+from cache import DiskCache, hash_key
+
+
+### Audio transcription
+# - Transcripts are cached on disk by hash of the audio content, repeated audio is not transcribed again
+# - Segments with timestamps are kept with the text
+# - Backends (TRANSCRIPTION_BACKEND):
+#   - assemblyai - AssemblyAI, job is submitted and polled without blocking other tools
+#   - whisper - local CPU transcription by faster-whisper (optional dependency)
+#   - file - local stand-in, reads transcript from text file next to the audio (<audio file>.txt)
+
+TRANSCRIPTION_BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", "assemblyai")
+TRANSCRIPT_CACHE_PATH = os.environ.get("TRANSCRIPT_CACHE_PATH", os.path.join("tmp", "transcripts.sqlite"))
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+
+# AssemblyAI job polling
+ASSEMBLYAI_POLL_SECONDS = 3
+ASSEMBLYAI_TIMEOUT = 600
+
+
+class Segment(TypedDict):
+    start: float # Seconds
+    end: float
+    text: str
+
+
+class Transcript(TypedDict):
+    text: str
+    segments: list[Segment]
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of file content"""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def format_segments(segments: list[Segment]) -> str:
+    """Transcript text with [mm:ss] timestamp of every segment"""
+
+    return "\n".join(
+        f"[{int(segment['start'] // 60):02d}:{int(segment['start'] % 60):02d}] {segment['text']}"
+        for segment in segments
+    )
+
+
+### Backends
+
+class TranscriptionBackend(ABC):
+    """Transcribes audio file, subclasses implement transcribe"""
+
+    name = ""
+
+    @abstractmethod
+    async def transcribe(self, audio_file: str) -> Transcript:
+        ...
+
+
+class AssemblyAIBackend(TranscriptionBackend):
+    """AssemblyAI - upload and submit in worker thread, then polling with async sleep"""
+
+    name = "assemblyai"
+
+    def __init__(self, api_key: str | None = None):
+
+        import assemblyai as aai
+
+        self.aai = aai
+        aai.settings.api_key = api_key or os.environ["ASSEMBLY_AI_API_KEY"]
+        self.config = aai.TranscriptionConfig(speech_model=aai.SpeechModel.best)
+
+    async def transcribe(self, audio_file: str) -> Transcript:
+
+        aai = self.aai
+
+        transcript = await asyncio.to_thread(aai.Transcriber(config=self.config).submit, audio_file)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ASSEMBLYAI_TIMEOUT
+        while transcript.status in (aai.TranscriptStatus.queued, aai.TranscriptStatus.processing):
+            if loop.time() > deadline:
+                raise TimeoutError(f"Transcription did not finish in {ASSEMBLYAI_TIMEOUT} s")
+            await asyncio.sleep(ASSEMBLYAI_POLL_SECONDS)
+            transcript = await asyncio.to_thread(aai.Transcript.get_by_id, transcript.id)
+
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+
+        sentences = await asyncio.to_thread(transcript.get_sentences)
+
+        return {
+            "text": transcript.text or "",
+            "segments": [
+                {"start": sentence.start / 1000, "end": sentence.end / 1000, "text": sentence.text}
+                for sentence in sentences
+            ],
+        }
+
+
+class WhisperBackend(TranscriptionBackend):
+    """Local CPU transcription, model is loaded with the first audio"""
+
+    name = "whisper"
+
+    def __init__(self, model_size: str = WHISPER_MODEL):
+
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("Local transcription requires faster-whisper: pip install faster-whisper") from e
+
+        self.model_size = model_size
+        self._model_class = WhisperModel
+        self._model = None
+
+    def _transcribe(self, audio_file: str) -> Transcript:
+
+        if self._model is None:
+            self._model = self._model_class(self.model_size, device="cpu", compute_type="int8")
+
+        segments, _ = self._model.transcribe(audio_file)
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text.strip()} for segment in segments]
+
+        return {"text": " ".join(segment["text"] for segment in segments), "segments": segments}
+
+    async def transcribe(self, audio_file: str) -> Transcript:
+        return await asyncio.to_thread(self._transcribe, audio_file)
+
+
+class FileBackend(TranscriptionBackend):
+    """Stand-in without any service, transcript is read from <audio file>.txt"""
+
+    name = "file"
+
+    async def transcribe(self, audio_file: str) -> Transcript:
+
+        with open(f"{audio_file}.txt", "r") as f:
+            text = f.read().strip()
+
+        return {"text": text, "segments": [{"start": 0.0, "end": 0.0, "text": text}]}
+
+
+BACKENDS = {
+    "assemblyai": AssemblyAIBackend,
+    "whisper": WhisperBackend,
+    "file": FileBackend,
+}
+
+
+def create_backend(name: str = TRANSCRIPTION_BACKEND) -> TranscriptionBackend:
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend {name}, use one of {', '.join(BACKENDS)}")
+
+    return BACKENDS[name]()
+
+
+### Cached transcriber
+
+class AudioTranscriber:
+    """Transcribes audio files through backend, transcripts are cached by audio content"""
+
+    def __init__(self, backend: TranscriptionBackend | None = None, path: str = TRANSCRIPT_CACHE_PATH):
+
+        self._backend = backend
+        self.store = DiskCache(path, table="transcripts", max_entries=100_000)
+
+        # Same audio requested concurrently is transcribed once
+        self._running: dict[str, asyncio.Task] = {}
+
+    @property
+    def backend_name(self) -> str:
+        return self._backend.name if self._backend is not None else TRANSCRIPTION_BACKEND
+
+    @property
+    def backend(self) -> TranscriptionBackend:
+        # Created on first cache miss, server starts and cached audio is returned even without credentials of the backend
+        if self._backend is None:
+            self._backend = create_backend()
+        return self._backend
+
+    async def transcribe(self, audio_file: str) -> Transcript:
+
+        key = hash_key(self.backend_name, await asyncio.to_thread(file_hash, audio_file))
+
+        value = self.store.get(key)
+        if value is not None:
+            return json.loads(value)
+
+        if key not in self._running:
+            self._running[key] = asyncio.create_task(self.backend.transcribe(audio_file))
+
+        try:
+            transcript = await asyncio.shield(self._running[key])
+        finally:
+            if key in self._running and self._running[key].done():
+                del self._running[key]
+
+        self.store.set(key, json.dumps(transcript))
+        return transcript
+
+    def stats(self) -> dict:
+        return self.store.stats()
@@ -1,12 +1,18 @@
 import requests
 import os
-from typing import Tuple
+import asyncio
+from typing import Tuple, AsyncIterator
 import mimetypes
 import base64
+import hashlib
+import io
 
+import httpx
 import pandas as pd
+from PIL import Image
 
 from state import TaskState
+from tables import TABLE_EXTENSIONS, summarize_table
 
 
 api_url = "https://agents-course-unit4-scoring.hf.space"
@@ -15,6 +21,18 @@ random_question_url = f"{api_url}/random-question"
 files_url = f"{api_url}/files"
 submit_url = f"{api_url}/submit"
 
+# Attachments download settings
+max_download_connections = 8
+download_chunk_size = 64 * 1024
+
+# Image attachments settings (model works with images fitted into 2048x2048 with shorter side 768)
+image_max_size = 2048
+image_max_short_side = 768
+image_mime_types = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp", "GIF": "image/gif"}
+
+# Data URLs of already prepared images by content hash
+_encoded_images: dict[str, str] = {}
+
 
 def get_question(random: bool = True):
     """
@@ -56,6 +74,95 @@ def get_question(random: bool = True):
         yield (question, task_id, file_name)
 
 
+async def _download_file(client: httpx.AsyncClient, task_id: str, file_name: str) -> None:
+    """
+    Streams task attachment into tmp directory in chunks.
+    Download is skipped when the file is already present - it is written only after complete download,
+    so present file is never partial.
+    """
+
+    file_path = os.path.join("tmp", file_name)
+    if os.path.exists(file_path):
+        return
+
+    # Write into temporary file first, so interrupted download is never used
+    partial_path = file_path + ".part"
+    try:
+        async with client.stream("GET", f"{files_url}/{task_id}") as response:
+            response.raise_for_status()
+            with open(partial_path, "wb") as f:
+                async for chunk in response.aiter_bytes(download_chunk_size):
+                    f.write(chunk)
+        os.replace(partial_path, file_path)
+    finally:
+        # Failed or cancelled download leaves no partial file
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+async def aiter_questions(random: bool = True) -> AsyncIterator[Tuple[str, str, str | None]]:
+    """
+    Async variant of get_question.
+    Attachments of all questions are downloaded concurrently over one connection pool.
+    Questions without file are yielded right away, others as soon as their file is downloaded.
+    Yields same tuples as get_question.
+    """
+
+    if random:
+        used_url = random_question_url
+    else:
+        used_url = questions_url
+
+    os.makedirs("tmp", exist_ok=True)
+
+    limits = httpx.Limits(max_connections=max_download_connections, max_keepalive_connections=max_download_connections)
+    timeout = httpx.Timeout(15, read=60)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+
+        question_data = await client.get(used_url)
+        question_data.raise_for_status()
+        questions_json = question_data.json()
+
+        # Create list if only 1 question was requested
+        if not isinstance(questions_json, list):
+            questions_json = [questions_json]
+
+        async def download(question, task_id, file_name):
+            await _download_file(client, task_id, file_name)
+            return (question, task_id, file_name)
+
+        downloads = []
+        try:
+            for question_json in questions_json:
+
+                question = question_json["question"]
+                task_id = question_json["task_id"]
+                file_name = question_json.get("file_name", None)
+
+                if file_name:
+                    downloads.append(asyncio.create_task(download(question, task_id, file_name)))
+                else:
+                    yield (question, task_id, file_name)
+
+            for finished in asyncio.as_completed(downloads):
+                try:
+                    yield await finished
+                except httpx.HTTPError as e:
+                    print(f"Attachment download failed, skipping question\nError details: {e}")
+
+        finally:
+            # Consumer stopped early
+            for pending in downloads:
+                pending.cancel()
+
+
+async def prefetch_questions(random: bool = True) -> list[Tuple[str, str, str | None]]:
+    """Fetches all questions with their attachments and returns ready-to-use task list"""
+
+    return [task async for task in aiter_questions(random)]
+
+
 def read_file(file_name: str) -> Tuple[str, str | bytes]:
     """
     Returns file content as a string
@@ -74,9 +181,9 @@ def read_file(file_name: str) -> Tuple[str, str | bytes]:
     if not extension:
         extension = "unknown"
 
-    # Excel files
-    if extension in ["xlsx", "xls"]:
-        return extension, pd.read_excel(file_path).to_string()
+    # Excel and CSV files (converted to Parquet, prompt gets only summary)
+    if extension in TABLE_EXTENSIONS:
+        return extension, summarize_table(file_name)
 
     # mp3 files
     if extension in ["mp3"]:
@@ -87,6 +194,45 @@ def read_file(file_name: str) -> Tuple[str, str | bytes]:
         return extension, f.read()
 
 
+def encode_image(image_content: bytes) -> str:
+    """
+    Prepares image for the model and returns it as data URL.
+    Image is downscaled to the resolution used by the model, result is cached by content hash.
+    """
+
+    content_hash = hashlib.sha256(image_content).hexdigest()
+    if content_hash in _encoded_images:
+        return _encoded_images[content_hash]
+
+    with Image.open(io.BytesIO(image_content)) as image:
+
+        image_format = image.format
+        width, height = image.size
+        scale = min(1.0, image_max_size / max(width, height), image_max_short_side / min(width, height))
+
+        # Re-encode only if needed, otherwise keep original bytes
+        if scale < 1 or image_format not in image_mime_types:
+
+            if scale < 1:
+                image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            if image_format == "JPEG":
+                image.convert("RGB").save(buffer, format="JPEG", quality=90)
+            else:
+                # Lossless for diagrams, boards, screenshots...
+                image_format = "PNG"
+                image.save(buffer, format="PNG", optimize=True)
+            image_content = buffer.getvalue()
+
+    image_base64 = base64.b64encode(image_content).decode("utf-8")
+    data_url = f"data:{image_mime_types[image_format]};base64,{image_base64}"
+
+    _encoded_images[content_hash] = data_url
+
+    return data_url
+
+
 def submit_answer(submission_data: dict):
     """
     Submit the answers for checking.
@@ -130,6 +276,21 @@ def submit_answer(submission_data: dict):
 
 
 
+def content_text(content: str | list) -> str:
+    """Text of message content - plain string or list of content blocks (MCP tools return [{"type": "text", "text": ...}])"""
+
+    if isinstance(content, str):
+        return content
+
+    parts = []
+    for block in content:
+        if isinstance(block, str):
+            parts.append(block)
+        elif block.get("type") == "text":
+            parts.append(block["text"])
+    return "\n".join(parts)
+
+
 def add_file_to_prompt(prompt:str, state:TaskState) -> str:
     """Adds file to provided prompt and returns enhanced prompt"""
 
@@ -142,14 +303,15 @@ def add_file_to_prompt(prompt:str, state:TaskState) -> str:
     if file_name:
 
         if file_type == "image":
-            image_base64 = base64.b64encode(file_content).decode("utf-8")
+            # Prepared once when the task is loaded
+            image_url = state.get("file_data_url") or encode_image(file_content)
 
             enhanced_prompt = [
                 {"type": "text", "text": prompt},
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{image_base64}",
+                        "url": image_url,
                     },
                 }
             ]
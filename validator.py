@@ -3,21 +3,16 @@ from dotenv import load_dotenv
 from typing import Union, Literal, Any
 
 from pydantic import BaseModel, Field
-from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import AnyMessage, HumanMessage
 from langgraph.graph import END
 
 from state import TaskState
+from models import get_structured_model, invoke_tiered
+from answer_format import ANSWER_FORMAT_RULES, check_answer
 
 
 load_dotenv()
 
-validator_model = AzureChatOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    azure_deployment="gpt-4.1",
-    openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-)
-
 
 class AnswerFeedback(BaseModel):
     """Feedback to the final answer to the question"""
@@ -34,11 +29,26 @@ class AnswerFeedback(BaseModel):
 
 ### Validator
 # - Validates if the produced answer has requested format
+# - Format rules decide obvious answers locally (see answer_format.py), LLM reviews only the ambiguous ones
+# - Rejected answer escalates the rest of the task to large models (see models.py)
 
 def validator(state: TaskState):
 
     question = state["question"]
     answer = state["answer"]
+    escalated = state.get("escalated", False)
+
+    if ANSWER_FORMAT_RULES:
+        check = check_answer(question, answer)
+        if check["verdict"] != "ambiguous":
+            feedback = check["feedback"] or "Answer accepted by format rules."
+            return {
+                "tool_messages": [],
+                "past_steps": [("Answer validation", feedback)],
+                "answer": check["answer"],
+                "escalated": escalated or check["verdict"] == "reject"
+            }
+        answer = check["answer"]
 
     prompt = (
         "You are a format reviewer. "
@@ -56,9 +66,12 @@ def validator(state: TaskState):
         f"{answer}"
     )
 
-    structured_validator_model = validator_model.with_structured_output(AnswerFeedback)
-
-    response = structured_validator_model.invoke([HumanMessage(prompt)])
+    response, escalate = invoke_tiered(
+        "validator",
+        lambda tier: get_structured_model("validator", AnswerFeedback, tier),
+        [HumanMessage(prompt)],
+        escalated=escalated,
+    )
 
     if not response.answer_accepted:
         answer = ""
@@ -67,7 +80,8 @@ def validator(state: TaskState):
         # "past_steps": [("Output format validation", response.content)], # This will be done by replanner via assistant_messages
         "tool_messages": [],
         "past_steps": [("Answer validation", response.answer_feedback)],
-        "answer": answer
+        "answer": answer,
+        "escalated": escalated or escalate or not response.answer_accepted
     }
 
 def validator_approval_condition(
@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+import json
+from io import StringIO
+from typing import TypedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import DiskCache
+from knowledge import BM25, tokenize, split_pieces, merge_pieces
+
+
+### Wikipedia passages
+# - Pages found for the query are split by section, tables become separate passages
+# - Passages are ranked against the query by BM25, only the top ones are returned with "Title#Section" anchor
+# - Parsed pages are cached on disk, follow-up queries about the same pages do not download them again
+# - Pages come from current Wikipedia or from offline snapshot (WIKI_SNAPSHOT_DIR, see wiki_index.py)
+
+WIKI_SEARCH_PAGES = int(os.environ.get("WIKI_SEARCH_PAGES", "3"))
+WIKI_TOP_PASSAGES = int(os.environ.get("WIKI_TOP_PASSAGES", "6"))
+WIKI_PASSAGE_TOKENS = 250
+WIKI_PAGE_CACHE_PATH = os.environ.get("WIKI_PAGE_CACHE_PATH", os.path.join("tmp", "wiki_pages.sqlite"))
+WIKI_PAGE_CACHE_TTL = float(os.environ.get("TOOL_CACHE_TTL_WIKI", 7 * 24 * 3600))
+
+# Tables are parsed from page HTML (needs beautifulsoup4 and lxml, skipped otherwise)
+WIKI_TABLES = os.environ.get("WIKI_TABLES", "true").lower() in ("1", "true", "yes")
+
+
+class Section(TypedDict):
+    section: str # Heading path, e.g. "Discography > Studio albums"
+    text: str
+
+
+class Page(TypedDict):
+    title: str
+    url: str
+    sections: list[Section]
+    tables: list[Section] # Table rows as CSV lines, first line is header
+
+
+def parse_sections(content: str) -> list[Section]:
+    """Splits plain text page content by '== Heading ==' lines into sections with heading paths"""
+
+    sections = []
+    path: list[str] = []
+    lines: list[str] = []
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            sections.append({"section": " > ".join(path) or "Introduction", "text": text})
+        lines.clear()
+
+    for line in content.split("\n"):
+        heading = re.fullmatch(r"\s*(={2,6})\s*(.+?)\s*\1\s*", line)
+        if heading:
+            flush()
+            level = len(heading.group(1)) - 2
+            path = path[:level] + [heading.group(2)]
+        else:
+            lines.append(line)
+    flush()
+
+    return sections
+
+
+def parse_tables(html: str) -> list[Section]:
+    """Wikitables of page HTML as CSV lines, with heading path of the section they are in"""
+
+    try:
+        import pandas as pd
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return []
+
+    soup = BeautifulSoup(html, "lxml")
+
+    tables = []
+    path: list[str] = []
+    for element in soup.find_all(["h2", "h3", "h4", "table"]):
+        if element.name != "table":
+            level = int(element.name[1]) - 2
+            path = path[:level] + [element.get_text(" ", strip=True).removesuffix("[edit]").strip()]
+            continue
+        if "wikitable" not in (element.get("class") or []):
+            continue
+        try:
+            frame = pd.read_html(StringIO(str(element)))[0]
+        except ValueError:
+            continue
+        if isinstance(frame.columns, pd.MultiIndex):
+            frame.columns = [" ".join(dict.fromkeys(str(part) for part in column)) for column in frame.columns]
+        tables.append({"section": " > ".join(path) or "Introduction", "text": frame.to_csv(index=False).strip()})
+
+    return tables
+
+
+def passages(page: Page, passage_tokens: int = WIKI_PASSAGE_TOKENS) -> list[tuple[str, str]]:
+    """(anchor, text) passages of the page, long sections and tables are split into several"""
+
+    result = []
+
+    for section in page["sections"]:
+        anchor = f"{page['title']}#{section['section']}"
+        for chunk in merge_pieces(split_pieces(section["text"], passage_tokens), passage_tokens):
+            result.append((anchor, chunk))
+
+    for table in page["tables"]:
+        anchor = f"{page['title']}#{table['section']} (table)"
+        header, *rows = table["text"].split("\n")
+        # Every part of long table keeps the header row
+        for chunk in merge_pieces(rows or [""], passage_tokens):
+            result.append((anchor, f"{header}\n{chunk}".strip()))
+
+    return result
+
+
+def rank_passages(pages: list[Page], query: str, top_k: int = WIKI_TOP_PASSAGES) -> list[tuple[str, str]]:
+    """Top passages of the pages for the query, most relevant first"""
+
+    candidates = [passage for page in pages for passage in passages(page)]
+    if not candidates:
+        return []
+
+    # Anchor is part of the passage, so query words matching title or section heading count too
+    scores = BM25([tokenize(f"{anchor} {text}") for anchor, text in candidates]).scores(tokenize(query))
+    ranking = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+
+    return [candidates[i] for i in ranking[:top_k]]
+
+
+def format_passages(ranked: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"[{anchor}]\n{text}" for anchor, text in ranked)
+
+
+### Page sources
+
+class LiveWikipedia:
+    """Pages of the current Wikipedia downloaded by wikipedia library"""
+
+    name = "live"
+    id = "live"
+    cache_pages = True
+
+    def __init__(self):
+        import wikipedia
+        self.wikipedia = wikipedia
+
+    def search(self, query: str, limit: int) -> list[str]:
+        return self.wikipedia.search(query, results=limit)
+
+    def page(self, title: str) -> Page | None:
+
+        wikipedia = self.wikipedia
+        try:
+            page = wikipedia.page(title, auto_suggest=False)
+        except (wikipedia.DisambiguationError, wikipedia.PageError):
+            return None
+
+        tables = []
+        if WIKI_TABLES:
+            try:
+                tables = parse_tables(page.html())
+            except Exception as e:
+                print(f"Tables of {title} skipped: {e!r}", file=sys.stderr) # stdout is MCP stdio channel
+
+        return {"title": page.title, "url": page.url, "sections": parse_sections(page.content), "tables": tables}
+
+
+class WikiSearch:
+    """Searches pages of the source and returns top passages, parsed pages are cached"""
+
+    def __init__(self, source=None, path: str = WIKI_PAGE_CACHE_PATH, ttl: float | None = WIKI_PAGE_CACHE_TTL):
+        self._source = source
+        self.store = DiskCache(path, table="wiki_pages", max_entries=10000, ttl=ttl)
+
+    @property
+    def source(self):
+        # Offline snapshot if configured (see wiki_index.py), otherwise current Wikipedia
+        if self._source is None:
+            if os.environ.get("WIKI_SNAPSHOT_DIR"):
+                from wiki_index import open_snapshot
+                self._source = open_snapshot(os.environ["WIKI_SNAPSHOT_DIR"], os.environ.get("WIKI_SNAPSHOT", ""))
+            else:
+                self._source = LiveWikipedia()
+        return self._source
+
+    @property
+    def source_id(self) -> str:
+        """Identifier of the page source (live site or snapshot with its path) for tool result cache"""
+        return self.source.id
+
+    def page(self, title: str) -> Page | None:
+
+        if not self.source.cache_pages:
+            return self.source.page(title)
+
+        key = f"{self.source.name}:{title}"
+        value = self.store.get(key)
+        if value is not None:
+            return json.loads(value)
+
+        page = self.source.page(title)
+        if page is not None:
+            self.store.set(key, json.dumps(page))
+        return page
+
+    def search(self, query: str, pages: int = WIKI_SEARCH_PAGES, top_k: int = WIKI_TOP_PASSAGES) -> str:
+
+        titles = self.source.search(query, pages)
+        if not titles:
+            return "No Wikipedia pages found."
+
+        # Pages are downloaded concurrently
+        with ThreadPoolExecutor(max_workers=len(titles)) as executor:
+            found = [page for page in executor.map(self.page, titles) if page]
+
+        ranked = rank_passages(found, query, top_k)
+        if not ranked:
+            return "No Wikipedia pages found."
+
+        return format_passages(ranked)
@@ -0,0 +1,465 @@
+import os
+import re
+import bz2
+import json
+import math
+import mmap
+import time
+import zlib
+import heapq
+import shutil
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from xml.etree import ElementTree
+
+import numpy as np
+
+from knowledge import tokenize
+from wiki import Page, parse_sections
+
+
+### Offline Wikipedia snapshot
+# - Index of Wikipedia dump (or its subset) built once, answers wiki_search locally without network
+# - Every snapshot is stored in its own directory named by dump date, e.g. tmp/wiki_snapshots/2022-12-20
+# - Inverted index (postings, lexicon), titles and article store are memory-mapped, only touched parts are read
+# - Titles are found by binary search in title order index, query scores are accumulated only for matching documents
+# - Search returns titles ranked by BM25 (title words weigh more), pages are then split into passages by wiki.py
+#
+# Build:  python wiki_index.py --dump enwiki-20221220-pages-articles.xml.bz2 [--titles titles.txt] [--limit 100000]
+#         python wiki_index.py --jsonl pages.jsonl --snapshot 2022-12-31
+
+WIKI_SNAPSHOT_DIR = os.environ.get("WIKI_SNAPSHOT_DIR", "")
+# Newest snapshot not newer than this date (YYYY-MM-DD) is used, newest snapshot when empty
+WIKI_SNAPSHOT = os.environ.get("WIKI_SNAPSHOT", "")
+
+# Title words count as if repeated in the text
+TITLE_WEIGHT = 5
+# Documents indexed in memory before the block is written to disk
+BLOCK_DOCUMENTS = 50000
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+### Wikitext to plain text
+
+def _replace_until_stable(pattern: str, replacement, text: str, flags: int = 0) -> str:
+    """Repeats substitution, so nested constructs are removed from the inside out"""
+
+    for _ in range(20):
+        text, count = re.subn(pattern, replacement, text, flags=flags)
+        if not count:
+            break
+    return text
+
+
+def _table_to_text(match: re.Match) -> str:
+    """Wikitable as lines of comma separated cells"""
+
+    lines = []
+    for row in re.split(r"\n\|-[^\n]*", match.group(0)):
+        cells = []
+        for line in row.split("\n"):
+            line = line.strip()
+            if not line or line[0] not in "|!" or line.startswith(("{|", "|}", "|+")):
+                continue
+            for cell in re.split(r"\|\||!!", line[1:]):
+                # Cell attributes are separated from the value by single |
+                cells.append(cell.split("|")[-1].strip())
+        if cells:
+            lines.append(", ".join(cells))
+
+    return "\n".join(lines)
+
+
+def _link_text(match: re.Match) -> str:
+
+    target, _, label = match.group(1).partition("|")
+    if re.match(r"\s*(File|Image|Category|Media):", target, flags=re.IGNORECASE):
+        return ""
+    return label.split("|")[-1] if label else target
+
+
+def wikitext_to_text(wikitext: str) -> str:
+    """Plain text with '== Heading ==' lines kept, so it can be split by wiki.parse_sections"""
+
+    text = re.sub(r"<!--.*?-->", "", wikitext, flags=re.DOTALL)
+    text = re.sub(r"<ref[^>]*/>", "", text)
+    text = re.sub(r"<ref[^>]*>.*?</ref>", "", text, flags=re.DOTALL)
+    text = _replace_until_stable(r"\{\{[^{}]*\}\}", "", text)
+    text = re.sub(r"\{\|.*?\n\|\}", _table_to_text, text, flags=re.DOTALL)
+    text = _replace_until_stable(r"\[\[([^\[\]]*)\]\]", _link_text, text)
+    text = re.sub(r"\[https?://[^\s\]]+\s*([^\]]*)\]", r"\1", text)
+    text = re.sub(r"'{2,}", "", text)
+    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+
+    return text.strip()
+
+
+### Input
+
+def iter_dump(path: str):
+    """(title, wikitext) of articles in MediaWiki XML dump (.xml or .xml.bz2), redirects are skipped"""
+
+    opener = bz2.open if path.endswith(".bz2") else open
+    with opener(path, "rb") as f:
+        title, namespace, redirect, text = None, None, False, None
+        for _, element in ElementTree.iterparse(f, events=("end",)):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = element.text
+            elif tag == "ns":
+                namespace = element.text
+            elif tag == "redirect":
+                redirect = True
+            elif tag == "text":
+                text = element.text or ""
+            elif tag == "page":
+                if namespace == "0" and not redirect and title:
+                    yield title, text
+                title, namespace, redirect, text = None, None, False, None
+                element.clear()
+
+
+def iter_jsonl(path: str):
+    """(title, text) from JSON lines with title and text (wikitext or plain text)"""
+
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                article = json.loads(line)
+                yield article["title"], article["text"]
+
+
+def snapshot_from_dump_name(path: str) -> str | None:
+    match = re.search(r"(\d{4})(\d{2})(\d{2})", os.path.basename(path))
+    return f"{match.group(1)}-{match.group(2)}-{match.group(3)}" if match else None
+
+
+### Builder
+
+def _write_block(postings: dict[str, list[str]], directory: str, number: int) -> str:
+    """Writes partial postings sorted by term, one 'term<TAB>doc:tf,doc:tf' line per term"""
+
+    path = os.path.join(directory, f"block_{number}.txt")
+    with open(path, "w") as f:
+        for term in sorted(postings):
+            f.write(f"{term}\t{','.join(postings[term])}\n")
+    return path
+
+
+def build_index(articles, output: str, snapshot: str, source: str, titles: set[str] | None = None,
+                limit: int | None = None, block_documents: int = BLOCK_DOCUMENTS) -> dict:
+    """Builds snapshot index from (title, wikitext) pairs into output/snapshot directory"""
+
+    directory = os.path.join(output, snapshot)
+    building = f"{directory}.building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    blocks_directory = tempfile.mkdtemp(dir=building)
+    blocks = []
+    postings: dict[str, list[str]] = defaultdict(list)
+    count = 0
+    total_length = 0
+    started = time.time()
+
+    with open(os.path.join(building, "articles.bin"), "wb") as articles_file, \
+         open(os.path.join(building, "articles.idx"), "wb") as offsets_file, \
+         open(os.path.join(building, "doclens.bin"), "wb") as lengths_file, \
+         open(os.path.join(building, "titles.txt"), "wb") as titles_file, \
+         open(os.path.join(building, "titles.idx"), "wb") as title_offsets_file:
+
+        for title, wikitext in articles:
+            if titles is not None and title not in titles:
+                continue
+            if limit is not None and count >= limit:
+                break
+
+            text = wikitext_to_text(wikitext)
+
+            offsets_file.write(np.uint64(articles_file.tell()).tobytes())
+            articles_file.write(zlib.compress(json.dumps({"title": title, "text": text}).encode("utf-8")))
+            title_offsets_file.write(np.uint64(titles_file.tell()).tobytes())
+            titles_file.write((title.replace("\n", " ") + "\n").encode("utf-8"))
+
+            frequencies = Counter(tokenize(text))
+            for term in tokenize(title):
+                frequencies[term] += TITLE_WEIGHT
+            for term, frequency in frequencies.items():
+                postings[term].append(f"{count}:{frequency}")
+
+            length = sum(frequencies.values())
+            lengths_file.write(np.uint32(length).tobytes())
+            total_length += length
+            count += 1
+
+            if count % block_documents == 0:
+                blocks.append(_write_block(postings, blocks_directory, len(blocks)))
+                postings.clear()
+                print(f"{count} articles indexed ({time.time() - started:.0f} s)")
+
+        offsets_file.write(np.uint64(articles_file.tell()).tobytes())
+        title_offsets_file.write(np.uint64(titles_file.tell()).tobytes())
+
+    _write_title_order(building, count)
+
+    if postings:
+        blocks.append(_write_block(postings, blocks_directory, len(blocks)))
+        postings.clear()
+
+    # Merge blocks - same terms of consecutive blocks are concatenated, so doc IDs stay sorted
+    terms = 0
+    with open(os.path.join(building, "postings.bin"), "wb") as postings_file, \
+         open(os.path.join(building, "lexicon.txt"), "wb") as lexicon_file, \
+         open(os.path.join(building, "lexicon.idx"), "wb") as lexicon_offsets_file:
+
+        files = [open(block, "r") for block in blocks]
+        try:
+            def keyed(i: int, block_file):
+                for line in block_file:
+                    yield (line.split("\t", 1)[0], i), line
+
+            lines = heapq.merge(*[keyed(i, block_file) for i, block_file in enumerate(files)])
+
+            current_term, current = None, []
+            position = 0
+
+            def write_term(term: str, entries: list[str]):
+                nonlocal position, terms
+                pairs = np.array([entry.split(":") for entry in ",".join(entries).split(",")], dtype=np.uint32)
+                postings_file.write(pairs.tobytes())
+                lexicon_offsets_file.write(np.uint64(lexicon_file.tell()).tobytes())
+                lexicon_file.write(f"{term}\t{position}\t{len(pairs)}\n".encode("utf-8"))
+                position += len(pairs)
+                terms += 1
+
+            for (term, _), line in lines:
+                if term != current_term and current_term is not None:
+                    write_term(current_term, current)
+                    current = []
+                current_term = term
+                current.append(line.rstrip("\n").split("\t", 1)[1])
+            if current_term is not None:
+                write_term(current_term, current)
+        finally:
+            for block_file in files:
+                block_file.close()
+
+    shutil.rmtree(blocks_directory)
+
+    meta = {
+        "snapshot": snapshot,
+        "source": source,
+        "articles": count,
+        "terms": terms,
+        "average_length": total_length / count if count else 0,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(building, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    # Replace previous build of the same snapshot at once
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(building, directory)
+
+    return meta
+
+
+def _write_title_order(directory: str, count: int) -> None:
+    """Doc IDs sorted by UTF-8 bytes of title (titles.order), so title is found by binary search"""
+
+    titles = _map(os.path.join(directory, "titles.txt"))
+    offsets = np.fromfile(os.path.join(directory, "titles.idx"), dtype=np.uint64)
+    order = sorted(range(count), key=lambda i: titles[int(offsets[i]):int(offsets[i + 1]) - 1])
+    np.array(order, dtype=np.uint32).tofile(os.path.join(directory, "titles.order"))
+    if titles is not None:
+        titles.close()
+
+
+### Snapshot reader
+
+def _map(path: str):
+    """Read-only memory map of the file (None for empty file)"""
+
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def find_snapshot(directory: str, date: str = "") -> str:
+    """Newest snapshot directory not newer than date (or newest at all)"""
+
+    snapshots = sorted(
+        name for name in os.listdir(directory)
+        if os.path.exists(os.path.join(directory, name, "meta.json")) and (not date or name <= date)
+    )
+    if not snapshots:
+        raise FileNotFoundError(f"No Wikipedia snapshot {'up to ' + date + ' ' if date else ''}in {directory}")
+
+    return os.path.join(directory, snapshots[-1])
+
+
+class WikiSnapshot:
+    """Memory-mapped snapshot index, page source for wiki.WikiSearch"""
+
+    # Pages are read locally, no need to cache them
+    cache_pages = False
+
+    def __init__(self, directory: str):
+
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+
+        self.name = f"snapshot:{self.meta['snapshot']}"
+        # Identifies the snapshot in tool result cache
+        self.id = f"{self.name}:{os.path.abspath(directory)}"
+        self.count = self.meta["articles"]
+        self.average_length = self.meta["average_length"] or 1
+
+        self._articles = _map(os.path.join(directory, "articles.bin"))
+        self._offsets = np.frombuffer(_map(os.path.join(directory, "articles.idx")), dtype=np.uint64)
+        self._lengths = np.frombuffer(_map(os.path.join(directory, "doclens.bin")) or b"", dtype=np.uint32)
+        postings = _map(os.path.join(directory, "postings.bin"))
+        self._postings = np.frombuffer(postings, dtype=np.uint32).reshape(-1, 2) if postings else np.zeros((0, 2), np.uint32)
+        self._lexicon = _map(os.path.join(directory, "lexicon.txt"))
+        lexicon_offsets = _map(os.path.join(directory, "lexicon.idx"))
+        self._lexicon_offsets = np.frombuffer(lexicon_offsets, dtype=np.uint64) if lexicon_offsets else np.zeros(0, np.uint64)
+
+        self._titles = _map(os.path.join(directory, "titles.txt"))
+        self._title_offsets = np.frombuffer(_map(os.path.join(directory, "titles.idx")), dtype=np.uint64)
+        self._title_order = np.frombuffer(_map(os.path.join(directory, "titles.order")) or b"", dtype=np.uint32)
+
+    def _title(self, i: int) -> bytes:
+        """UTF-8 title of document i (without line end)"""
+
+        return self._titles[int(self._title_offsets[i]):int(self._title_offsets[i + 1]) - 1]
+
+    def _find_title(self, title: str) -> int | None:
+        """Doc ID of the title (binary search in title order)"""
+
+        key = title.encode("utf-8")
+        low, high = 0, len(self._title_order)
+        while low < high:
+            middle = (low + high) // 2
+            i = int(self._title_order[middle])
+            middle_title = self._title(i)
+            if middle_title == key:
+                return i
+            if middle_title < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def _lexicon_entry(self, i: int) -> tuple[str, int, int]:
+        start = int(self._lexicon_offsets[i])
+        end = self._lexicon.find(b"\n", start)
+        term, position, count = self._lexicon[start:end].decode("utf-8").split("\t")
+        return term, int(position), int(count)
+
+    def _lookup(self, term: str) -> tuple[int, int] | None:
+        """Position and count of postings of the term (binary search in sorted lexicon)"""
+
+        low, high = 0, len(self._lexicon_offsets)
+        while low < high:
+            middle = (low + high) // 2
+            middle_term, position, count = self._lexicon_entry(middle)
+            if middle_term == term:
+                return position, count
+            if middle_term < term:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def search(self, query: str, limit: int) -> list[str]:
+        """Titles of the best matching articles (BM25)"""
+
+        # Scores only of documents containing some query term
+        matches = []
+        contributions = []
+
+        for term in set(tokenize(query)):
+            entry = self._lookup(term)
+            if entry is None:
+                continue
+            position, count = entry
+            postings = self._postings[position:position + count]
+            documents = postings[:, 0]
+            frequencies = postings[:, 1].astype(np.float32)
+            idf = math.log(1 + (self.count - count + 0.5) / (count + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[documents] / self.average_length)
+            matches.append(documents)
+            contributions.append(idf * frequencies * (BM25_K1 + 1) / (frequencies + norm))
+
+        if not matches or limit <= 0:
+            return []
+
+        documents, inverse = np.unique(np.concatenate(matches), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+
+        # Best documents without sorting all matches, ties keep lower doc ID first
+        if len(documents) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            threshold = scores[best].min()
+            best = np.flatnonzero(scores >= threshold)
+        else:
+            best = np.arange(len(documents))
+        best = best[np.lexsort((documents[best], -scores[best]))][:limit]
+
+        return [self._title(int(documents[i])).decode("utf-8") for i in best if scores[i] > 0]
+
+    def page(self, title: str) -> Page | None:
+
+        i = self._find_title(title)
+        if i is None:
+            return None
+
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        article = json.loads(zlib.decompress(self._articles[start:end]))
+
+        return {
+            "title": article["title"],
+            "url": f"https://en.wikipedia.org/wiki/{article['title'].replace(' ', '_')}",
+            "sections": parse_sections(article["text"]),
+            "tables": [], # Tables are part of section text
+        }
+
+
+def open_snapshot(directory: str = WIKI_SNAPSHOT_DIR, date: str = WIKI_SNAPSHOT) -> WikiSnapshot:
+    return WikiSnapshot(find_snapshot(directory, date))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Builds offline Wikipedia snapshot index")
+    parser.add_argument("--dump", help="MediaWiki XML dump (pages-articles .xml or .xml.bz2)")
+    parser.add_argument("--jsonl", help="JSON lines with title and text of articles")
+    parser.add_argument("--snapshot", help="Snapshot date YYYY-MM-DD (default date from dump file name)")
+    parser.add_argument("--output", default=WIKI_SNAPSHOT_DIR or os.path.join("tmp", "wiki_snapshots"))
+    parser.add_argument("--titles", help="File with titles of articles to index, one per line (subset of the dump)")
+    parser.add_argument("--limit", type=int, help="Maximal number of indexed articles")
+    args = parser.parse_args()
+
+    if bool(args.dump) == bool(args.jsonl):
+        parser.error("Provide either --dump or --jsonl")
+
+    source = args.dump or args.jsonl
+    snapshot = args.snapshot or snapshot_from_dump_name(source)
+    if not snapshot:
+        parser.error("Provide --snapshot, date could not be read from the file name")
+
+    titles = None
+    if args.titles:
+        with open(args.titles, "r") as f:
+            titles = {line.strip() for line in f if line.strip()}
+
+    articles = iter_dump(args.dump) if args.dump else iter_jsonl(args.jsonl)
+    meta = build_index(articles, args.output, snapshot, os.path.basename(source), titles, args.limit)
+    print(json.dumps(meta, indent=2))
@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import math
+import asyncio
+
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from transcription import Segment, format_segments
+
+
+### YouTube transcripts
+# - Transcript of the requested video, fetched once and stored by video ID with segment timestamps
+# - Short transcripts are returned whole, long ones as overview, details are retrieved by time range or keyword
+
+YOUTUBE_DIR = os.path.join("tmp", "youtube")
+
+# Longer transcripts are returned as overview
+FULL_TRANSCRIPT_CHARS = 6000
+# Overview shows beginning of every window (at least a minute long, at most OVERVIEW_MAX_WINDOWS windows)
+OVERVIEW_WINDOW_SECONDS = 60
+OVERVIEW_MAX_WINDOWS = 30
+OVERVIEW_WINDOW_CHARS = 120
+# Segments around keyword matches and maximal length of search result
+KEYWORD_CONTEXT_SEGMENTS = 2
+MAX_RESULT_CHARS = 6000
+
+TRANSCRIPT_LANGUAGES = ["en"]
+
+
+def extract_video_id(video_url: str) -> str:
+    """Video ID from YouTube URL (watch, youtu.be, shorts, embed) or the ID itself"""
+
+    match = re.search(r"(?:v=|youtu\.be/|shorts/|embed/|live/)([\w-]{11})", video_url)
+    if match:
+        return match.group(1)
+
+    if re.fullmatch(r"[\w-]{11}", video_url.strip()):
+        return video_url.strip()
+
+    raise ValueError(f"No YouTube video ID found in {video_url}")
+
+
+def parse_time(value: str) -> float | None:
+    """Seconds from 'hh:mm:ss', 'mm:ss' or plain seconds, None for empty value"""
+
+    value = value.strip()
+    if not value:
+        return None
+
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _fetch_segments(video_id: str) -> list[Segment]:
+
+    # youtube_transcript_api < 1.0 has class method get_transcript, newer versions fetch on instance
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        snippets = YouTubeTranscriptApi.get_transcript(video_id, languages=TRANSCRIPT_LANGUAGES)
+    else:
+        snippets = YouTubeTranscriptApi().fetch(video_id, languages=TRANSCRIPT_LANGUAGES).to_raw_data()
+
+    return [
+        {"start": snippet["start"], "end": snippet["start"] + snippet["duration"], "text": snippet["text"].replace("\n", " ")}
+        for snippet in snippets
+    ]
+
+
+def load_segments(video_id: str) -> list[Segment]:
+    """Transcript segments of the video, fetched on first request and stored on disk"""
+
+    path = os.path.join(YOUTUBE_DIR, f"{video_id}.json")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+
+    segments = _fetch_segments(video_id)
+
+    os.makedirs(YOUTUBE_DIR, exist_ok=True)
+    with open(f"{path}.part", "w") as f:
+        json.dump(segments, f)
+    os.replace(f"{path}.part", path)
+
+    return segments
+
+
+async def aload_segments(video_url: str) -> list[Segment]:
+    return await asyncio.to_thread(load_segments, extract_video_id(video_url))
+
+
+def transcript_overview(segments: list[Segment]) -> str:
+    """Whole transcript if short, otherwise beginning of every window with timestamps"""
+
+    text = " ".join(segment["text"] for segment in segments)
+    if len(text) <= FULL_TRANSCRIPT_CHARS:
+        return text
+
+    minutes = math.ceil(segments[-1]["end"] / OVERVIEW_WINDOW_SECONDS / OVERVIEW_MAX_WINDOWS)
+    window_seconds = max(1, minutes) * OVERVIEW_WINDOW_SECONDS
+
+    windows: dict[int, list[str]] = {}
+    for segment in segments:
+        windows.setdefault(int(segment["start"] // window_seconds), []).append(segment["text"])
+
+    lines = [
+        f"Transcript is long ({segments[-1]['end'] / 60:.0f} minutes), overview of every {window_seconds // 60} minute(s) follows. "
+        "Use search_video_transcript to get full text of a time range or of parts with a keyword."
+    ]
+    for window, texts in sorted(windows.items()):
+        start = window * window_seconds
+        window_text = " ".join(texts)
+        if len(window_text) > OVERVIEW_WINDOW_CHARS:
+            window_text = window_text[:OVERVIEW_WINDOW_CHARS] + "..."
+        lines.append(f"[{start // 60:02d}:{start % 60:02d}] {window_text}")
+
+    return "\n".join(lines)
+
+
+def search_segments(segments: list[Segment], keyword: str = "", start: float | None = None, end: float | None = None) -> str:
+    """Segments in time range and/or around keyword matches, with timestamps"""
+
+    selected = [
+        i for i, segment in enumerate(segments)
+        if (start is None or segment["end"] >= start) and (end is None or segment["start"] <= end)
+    ]
+
+    if keyword:
+        keyword = keyword.lower()
+        matches = [i for i in selected if keyword in segments[i]["text"].lower()]
+        if not matches:
+            return f"Keyword '{keyword}' not found in the transcript."
+
+        # Matches with neighbouring segments for context
+        selected = sorted({
+            j for i in matches
+            for j in range(max(0, i - KEYWORD_CONTEXT_SEGMENTS), min(len(segments), i + KEYWORD_CONTEXT_SEGMENTS + 1))
+        })
+
+    if not selected:
+        return "No transcript in the requested time range."
+
+    result = format_segments([segments[i] for i in selected])
+    if len(result) > MAX_RESULT_CHARS:
+        result = result[:MAX_RESULT_CHARS] + "\n... (result truncated, narrow the time range)"
+
+    return result